@@ -2,8 +2,12 @@ from flask import Flask, render_template, request, jsonify, session, redirect, u
 import random
 import os
 import uuid
+import functools
+import math
+import time
 from datetime import datetime, timedelta
-from models import db, User, Progress, Analytics, LearningPath, LeaderboardScore, Duel, DuelScore
+from sqlalchemy import func, select, and_, or_
+from models import db, upsert, schema_problems, User, Progress, Analytics, LearningPath, LeaderboardScore, LeaderboardPeriodScore, Duel, DuelParticipant, DuelScore
 import json
 from google.oauth2 import id_token
 from google.auth.transport import requests
@@ -13,6 +17,20 @@ import google.auth.transport.requests
 import pathlib
 import requests as http_requests
 from config import config
+from question_pool import PooledQuestionGenerator
+from write_behind import StatsWriteBuffer
+from session_stats import SessionStatsStore
+from question_tokens import QuestionTokenSigner, InvalidQuestionToken, compute_answer
+from question_streams import QuestionStream, balanced_question_set, new_seed
+from question_space import QuestionSpace
+from duel_scheduler import RoundScheduler, RoomBroadcaster
+from duel_store import create_duel_store, ConnectionIndex
+from duel_spectators import SpectatorFeed, spectator_room
+from latency import LatencyTracker
+from duel_wire import DuelWire, wire_room
+from matchmaking import MatchmakingQueue, QueueEntry
+from http_cache import conditional, etag_for, apply_cache_policy
+from leaderboard_index import LeaderboardIndex, NO_TIMESTAMP, entry_key, encode_cursor, decode_cursor
 from flask_socketio import SocketIO, emit, join_room, leave_room
 
 # Determine configuration based on environment
@@ -27,348 +45,477 @@ config[config_name].init_app(app)
 if app.config.get('DEBUG', False):
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-# Initialize SocketIO for WebSocket support
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+# Initialize SocketIO for WebSocket support; a message queue lets room
+# broadcasts reach clients connected to other workers
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode='eventlet',
+    message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE')
+)
 
 # Google OAuth Configuration
 GOOGLE_CLIENT_ID = app.config['GOOGLE_CLIENT_ID']
 GOOGLE_CLIENT_SECRET = app.config['GOOGLE_CLIENT_SECRET']
 client_secrets_file = os.path.join(pathlib.Path(__file__).parent, "client_secret.json")
 
-# Add response headers for better performance
+# Cache-Control per route (see http_cache); routes without a policy are never cached
 @app.after_request
 def add_header(response):
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return apply_cache_policy(response, app.view_functions.get(request.endpoint))
 
-db.init_app(app)
-
-class QuestionGenerator:
-    def __init__(self):
-        self.used_questions = set()
-
-    def generate_question(self, mode='dynamic', operations=None, min_range=1, max_range=100):
-        if operations is None:
-            operations = ['+', '-', '*', '/']
-        
-        while True:
-            operation = random.choice(operations)
-
-            if operation == '+':
-                # Addition: both numbers from 2 to 100
-                a, b = random.randint(2, 100), random.randint(2, 100)
-            elif operation == '-':
-                # Subtraction: addition in reverse (2 to 100)
-                a = random.randint(2, 100)
-                b = random.randint(2, a)  # Ensure b <= a for positive result
-            elif operation == '*':
-                # Multiplication: first number 2-12, second number 2-100
-                a = random.randint(2, 12)
-                b = random.randint(2, 100)
-            else:  # division
-                # Division: multiplication in reverse
-                # First choose b (divisor) from 2-12
-                b = random.randint(2, 12)
-                # Then choose a multiplier from 2-100 to get a
-                multiplier = random.randint(2, 100)
-                a = b * multiplier
-
-            question_str = f'{a} {operation} {b}'
-            if question_str not in self.used_questions:
-                self.used_questions.add(question_str)
-                return question_str, eval(question_str)
-
-            if len(self.used_questions) > 100:
-                self.used_questions.clear()
-
-class AdaptiveQuestionGenerator:
-    def __init__(self):
-        self.history = {'+': [], '-': [], '*': [], '/': []}
+template_hashes = {}  # {template name: ETag}
 
-    def generate_question(self):
-        # Determine the operation the user struggles with the most
-        operation = min(self.history, key=lambda op: sum(self.history[op][-10:]))
+def template_etag(name):
+    """ETag from a template's source, re-read only when templates auto-reload"""
+    if name not in template_hashes or app.jinja_env.auto_reload:
+        source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+        template_hashes[name] = etag_for('page', source)
+    return template_hashes[name]
 
-        if operation == '+':
-            a, b = random.randint(10, 99), random.randint(10, 99)
-        elif operation == '-':
-            a = random.randint(10, 99)
-            b = random.randint(1, a)
-        elif operation == '*':
-            a, b = random.randint(2, 12), random.randint(2, 12)
-        else:  # division
-            b = random.randint(2, 12)
-            a = b * random.randint(1, 12)
+def static_page(template):
+    """Route decorator for pages that render `template` with nothing user-specific"""
+    return conditional(
+        f"public, max-age={app.config['PAGE_CACHE_MAX_AGE']}",
+        lambda **kwargs: template_etag(template)
+    )
 
-        return f'{a} {operation} {b}', eval(f'{a} {operation} {b}')
+db.init_app(app)
 
-    def update_history(self, operation, correct):
-        self.history[operation].append(correct)
+# Progress/Analytics deltas are buffered and flushed in the background
+stats_buffer = StatsWriteBuffer()
+stats_buffer.init_app(app, socketio)
 
 class MentalMathTrainer:
     def __init__(self):
-        self.correct_answers = 0
-        self.generator = QuestionGenerator()
-        self.session_start_time = datetime.now()
-        self.response_times = []
+        self.generator = PooledQuestionGenerator()
+        self.sessions = SessionStatsStore(
+            capacity=app.config['SESSION_STATS_CAPACITY'],
+            idle_timeout=app.config['SESSION_IDLE_TIMEOUT']
+        )
 
     def check_answer(self, user_answer, correct_answer, operation, response_time):
+        """Check one attempt; returns (is_correct, the user's SessionStats or None when not recorded)"""
         is_correct = user_answer == correct_answer
-        if is_correct:
-            self.correct_answers += 1
+        stats = None
         
-        # Only update database if user is logged in and not on Vercel (to reduce latency)
+        # Only record progress if user is logged in and not on Vercel (to reduce latency)
         if 'user_id' in session and not os.environ.get('VERCEL'):
-            try:
-                progress = Progress.query.filter_by(
-                    user_id=session['user_id'],
-                    operation=operation
-                ).first()
-                
-                if not progress:
-                    progress = Progress(
-                        user_id=session['user_id'],
-                        operation=operation,
-                        difficulty_level=1,
-                        total_attempts=0,
-                        correct_answers=0
-                    )
-                    db.session.add(progress)
-                
-                if progress.total_attempts is None:
-                    progress.total_attempts = 0
-                if progress.correct_answers is None:
-                    progress.correct_answers = 0
-                
-                progress.total_attempts += 1
-                if is_correct:
-                    progress.correct_answers += 1
-                progress.last_attempt = datetime.utcnow()
-                
-                # Update analytics
-                today = datetime.utcnow().date()
-                analytics = Analytics.query.filter_by(
-                    user_id=session['user_id'],
-                    session_date=today
-                ).first()
-                
-                if not analytics:
-                    analytics = Analytics(
-                        user_id=session['user_id'],
-                        session_date=today,
-                        questions_attempted=0,
-                        correct_answers=0,
-                        average_response_time=0.0,
-                        session_duration=0
-                    )
-                    db.session.add(analytics)
-                
-                if analytics.questions_attempted is None:
-                    analytics.questions_attempted = 0
-                if analytics.correct_answers is None:
-                    analytics.correct_answers = 0
-                if analytics.average_response_time is None:
-                    analytics.average_response_time = 0.0
-                if analytics.session_duration is None:
-                    analytics.session_duration = 0
-                
-                analytics.questions_attempted += 1
-                if is_correct:
-                    analytics.correct_answers += 1
-                
-                self.response_times.append(response_time)
-                analytics.average_response_time = sum(self.response_times) / len(self.response_times)
-                analytics.session_duration = (datetime.now() - self.session_start_time).seconds
-                
-                db.session.commit()
-            except Exception as e:
-                # Silently fail on database errors to prevent UI lag
-                print(f"Database error: {e}")
+            stats = self.sessions.record(session['user_id'], response_time, is_correct)
+            # Deltas are written to the database by the write-behind buffer
+            stats_buffer.add(
+                session['user_id'],
+                operation,
+                attempts=1,
+                correct=int(is_correct),
+                response_time_sum=response_time,
+                session_duration=stats.duration
+            )
+        
+        return is_correct, stats
+
+    def check_answers(self, attempts):
+        """Check a batch of (user_answer, correct_answer, operation, response_time) attempts.
+
+        Attempts are folded into one buffered delta per operation, so the whole
+        batch lands in the database as a single Progress update per operation
+        and one Analytics update per day.
+        """
+        results = []
+        deltas = {}  # {operation: [attempts, correct, response_time_sum]}
+        
+        user_id = session.get('user_id') if not os.environ.get('VERCEL') else None
+        stats = None
+        
+        for user_answer, correct_answer, operation, response_time in attempts:
+            is_correct = user_answer == correct_answer
+            results.append(is_correct)
+            
+            delta = deltas.setdefault(operation, [0, 0, 0.0])
+            delta[0] += 1
+            delta[1] += int(is_correct)
+            delta[2] += response_time
+            
+            if user_id is not None:
+                stats = self.sessions.record(user_id, response_time, is_correct)
         
-        return is_correct
+        if stats is not None:
+            for operation, (attempted, correct, response_time_sum) in deltas.items():
+                stats_buffer.add(
+                    user_id,
+                    operation,
+                    attempts=attempted,
+                    correct=correct,
+                    response_time_sum=response_time_sum,
+                    session_duration=stats.duration
+                )
+        
+        return results
 
 trainer = MentalMathTrainer()
 
+# Signed question tokens let any worker check answers without shared state
+question_signer = QuestionTokenSigner(app.config['SECRET_KEY'], app.config['QUESTION_TOKEN_MAX_AGE'])
+
+def question_payload(a, operation, b, answer):
+    """Serialize one question with its signed token"""
+    return {
+        'question': f'{a} {operation} {b}',
+        'answer': answer,
+        'token': question_signer.sign(a, operation, b)
+    }
+
+def parse_response_time(value):
+    """A client-reported response time in seconds; raises ValueError unless finite and >= 0
+
+    NaN or infinity would poison the Analytics running average and the
+    session estimators for good.
+    """
+    response_time = float(value)
+    if not math.isfinite(response_time) or response_time < 0:
+        raise ValueError(f'Invalid response time: {value!r}')
+    return response_time
+
+def verify_attempt(token):
+    """Return (correct_answer, operation) for a signed question token"""
+    a, operation, b, _ = question_signer.verify(token)
+    return compute_answer(a, operation, b), operation
+
 # Duel Management System
+def new_duel_state(duel_id, host_id, time_limit, max_rounds, question_seed, questions, max_players=2):
+    """In-memory state of a duel; authoritative while the duel runs"""
+    return {
+        'duel_id': duel_id,
+        'host_id': host_id,
+        'max_players': max_players,
+        'status': 'waiting',
+        'current_question': None,
+        'current_answer': None,
+        'round_number': 1,
+        'round_started': 0,  # last round start_round ran for; a round is never started twice
+        'max_rounds': max_rounds,
+        'time_limit': time_limit,
+        'question_seed': question_seed,
+        'questions': questions,  # [[a, op, b], ...], one per round
+        'scores': {host_id: 0},  # one entry per participant, in join order
+        'answered': set(),
+        'forfeited': set(),
+        'question_start_time': None,
+        'last_activity': time.time(),
+        'disconnected': {},  # {user_id: unix time the player's last connection dropped}
+        'version': 0,  # bumped on every write; the status endpoint's ETag
+        # Compact event log persisted in bulk, used for crash recovery:
+        #   ['a', round, user_id, correct, points, response_time]  answer
+        #   ['r', round]                                           round ended
+        #   ['f', round, user_id]                                  player forfeited
+        'journal': []
+    }
+
+def replay_journal(duel_data, journal):
+    """Rebuild scores and the current round from a persisted journal"""
+    for entry in journal:
+        if entry[0] == 'a':
+            _, _, user_id, _, points, _ = entry
+            duel_data['scores'][user_id] = duel_data['scores'].get(user_id, 0) + points
+        elif entry[0] == 'r':
+            duel_data['round_number'] = entry[1] + 1
+        elif entry[0] == 'f':
+            duel_data['forfeited'].add(entry[2])
+    duel_data['journal'] = list(journal)
+    return duel_data
+
 class DuelManager:
-    def __init__(self):
-        self.active_duels = {}  # {room_id: duel_data}
-        self.player_rooms = {}  # {user_id: room_id}
+    def __init__(self, store, checkpoint_rounds=5, max_duels=10000):
+        # Duel state lives in a pluggable store (in-process or shared between workers)
+        self.store = store
+        # Persist the journal every N rounds; results are always written at duel end
+        self.checkpoint_rounds = checkpoint_rounds
+        self.max_duels = max_duels
+        self.metrics = {
+            'duels_created': 0,
+            'duels_completed': 0,
+            'duels_forfeited': 0,
+            'duels_expired': 0,
+            'duels_rejected': 0
+        }
+    
+    def get_duel(self, room_id):
+        return self.store.get(room_id)
     
-    def create_duel(self, player1_id, time_limit=30, max_rounds=10):
-        """Create a new duel and return room_id"""
+    def create_duel(self, host_id, time_limit=30, max_rounds=10, max_players=2):
+        """Create a new duel and return room_id, or None when at capacity"""
+        if len(self.store.room_ids()) >= self.max_duels:
+            self.metrics['duels_rejected'] += 1
+            return None
+        
         room_id = str(uuid.uuid4())[:8]
+        # Every round's question is generated up front from the seed, so all
+        # players get the same difficulty-balanced, reproducible set
+        question_seed = new_seed()
+        questions = [[a, op, b] for a, op, b, _ in balanced_question_set(question_seed, max_rounds)]
         
         # Create duel in database
         duel = Duel(
             room_id=room_id,
-            player1_id=player1_id,
+            player1_id=host_id,
             status='waiting',
             time_limit=time_limit,
-            max_rounds=max_rounds
+            max_rounds=max_rounds,
+            max_players=max_players,
+            question_seed=question_seed,
+            questions=json.dumps(questions, separators=(',', ':'))
         )
         db.session.add(duel)
-        
-        # Create score records
-        score1 = DuelScore(duel_id=duel.id, user_id=player1_id)
-        db.session.add(score1)
-        
+        db.session.flush()  # assign duel.id for the participant record
+        db.session.add(DuelParticipant(duel_id=duel.id, user_id=host_id))
         db.session.commit()
         
-        # Store in memory for quick access
-        self.active_duels[room_id] = {
-            'duel_id': duel.id,
-            'player1_id': player1_id,
-            'player2_id': None,
-            'status': 'waiting',
-            'current_question': None,
-            'current_answer': None,
-            'round_number': 1,
-            'max_rounds': max_rounds,
-            'time_limit': time_limit,
-            'scores': {player1_id: 0},
-            'question_start_time': None
-        }
+        # Store in the state store for quick access
+        self._save(room_id, new_duel_state(
+            duel.id, host_id, time_limit, max_rounds, question_seed, questions, max_players
+        ))
         
-        self.player_rooms[player1_id] = room_id
+        self.store.set_player_room(host_id, room_id)
+        self.metrics['duels_created'] += 1
         return room_id
     
-    def join_duel(self, room_id, player2_id):
-        """Join an existing duel"""
-        if room_id not in self.active_duels:
-            return False, "Duel not found"
-        
-        duel_data = self.active_duels[room_id]
-        if duel_data['status'] != 'waiting':
-            return False, "Duel already started"
-        
-        if duel_data['player2_id'] is not None:
-            return False, "Duel is full"
-        
-        # Update database
-        duel = Duel.query.filter_by(room_id=room_id).first()
-        if duel:
-            duel.player2_id = player2_id
-            duel.status = 'active'
+    def join_duel(self, room_id, user_id):
+        """Join an existing duel; it starts on its own once the room is full"""
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None:
+                return False, "Duel not found"
             
-            # Create score record for player 2
-            score2 = DuelScore(duel_id=duel.id, user_id=player2_id)
-            db.session.add(score2)
+            if duel_data['status'] != 'waiting':
+                return False, "Duel already started"
             
-            db.session.commit()
-        
-        # Update memory
-        duel_data['player2_id'] = player2_id
-        duel_data['status'] = 'active'
-        duel_data['scores'][player2_id] = 0
-        self.player_rooms[player2_id] = room_id
+            if user_id in duel_data['scores']:
+                return False, "Already in this duel"
+            
+            if len(duel_data['scores']) >= duel_data['max_players']:
+                return False, "Duel is full"
+            
+            duel_data['scores'][user_id] = 0
+            full = len(duel_data['scores']) >= duel_data['max_players']
+            
+            # Update database
+            duel = Duel.query.filter_by(room_id=room_id).first()
+            if duel:
+                db.session.add(DuelParticipant(duel_id=duel.id, user_id=user_id))
+                if duel.player2_id is None:
+                    duel.player2_id = user_id  # first opponent, kept for two-player history
+                if full:
+                    duel.status = 'active'
+                db.session.commit()
+            
+            # Update state
+            if full:
+                duel_data['status'] = 'active'
+            duel_data['last_activity'] = time.time()
+            self._save(room_id, duel_data)
+            self.store.set_player_room(user_id, room_id)
         
         return True, "Joined duel successfully"
     
-    def start_round(self, room_id):
-        """Start a new round with a new question"""
-        if room_id not in self.active_duels:
+    def activate(self, room_id, user_id):
+        """Let the host start a room that isn't full yet (needs two players)"""
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None:
+                return False
+            if duel_data['status'] == 'active':
+                return True
+            if duel_data['status'] != 'waiting' or user_id != duel_data['host_id'] or len(duel_data['scores']) < 2:
+                return False
+            
+            duel = Duel.query.filter_by(room_id=room_id).first()
+            if duel:
+                duel.status = 'active'
+                db.session.commit()
+            
+            duel_data['status'] = 'active'
+            duel_data['last_activity'] = time.time()
+            self._save(room_id, duel_data)
+        return True
+    
+    def active_players(self, duel_data):
+        """Players still in the duel and connected"""
+        return [
+            user_id for user_id in duel_data['scores']
+            if user_id not in duel_data['forfeited'] and user_id not in duel_data['disconnected']
+        ]
+    
+    def snapshot(self, room_id):
+        """Public view of a duel, as served to the status endpoint and spectators"""
+        duel_data = self.store.get(room_id)
+        if duel_data is None:
             return None
-        
-        duel_data = self.active_duels[room_id]
-        if duel_data['status'] != 'active':
+        players = list(duel_data['scores'])
+        return {
+            'status': duel_data['status'],
+            'host_id': duel_data['host_id'],
+            'players': players,
+            'max_players': duel_data['max_players'],
+            'player1_id': players[0],
+            'player2_id': players[1] if len(players) > 1 else None,
+            'scores': dict(duel_data['scores']),  # copied: the feed diffs against older snapshots
+            'forfeited': sorted(duel_data['forfeited']),
+            'round': duel_data['round_number'],
+            'max_rounds': duel_data['max_rounds'],
+            'question': duel_data['current_question'] if duel_data['status'] == 'active' else None,
+            'answered': len(duel_data['answered'])
+        }
+    
+    def version(self, room_id):
+        duel_data = self.store.get(room_id)
+        return duel_data['version'] if duel_data is not None else None
+    
+    def standings(self, room_id):
+        """Scores ranked high to low plus round progress, for one broadcast per tick"""
+        duel_data = self.store.get(room_id)
+        if duel_data is None or duel_data['status'] != 'active':
             return None
-        
-        # Generate new question
-        question, answer = trainer.generator.generate_question()
-        
-        # Update database
-        duel = Duel.query.filter_by(room_id=room_id).first()
-        if duel:
-            duel.current_question = question
-            duel.current_answer = answer
-            duel.question_start_time = datetime.utcnow()
-            db.session.commit()
-        
-        # Update memory
-        duel_data['current_question'] = question
-        duel_data['current_answer'] = answer
-        duel_data['question_start_time'] = datetime.utcnow()
+        ranked = sorted(duel_data['scores'].items(), key=lambda item: -item[1])
+        return {
+            'round': duel_data['round_number'],
+            'answered': len(duel_data['answered']),
+            'players': len(self.active_players(duel_data)),
+            'standings': [
+                {'user_id': user_id, 'score': score, 'rank': rank, 'forfeited': user_id in duel_data['forfeited']}
+                for rank, (user_id, score) in enumerate(ranked, 1)
+            ]
+        }
+    
+    def start_round(self, room_id):
+        """Start a new round with a new question
+
+        Returns None if the round has already been started, so a duplicate
+        start from another worker cannot reset the answers or the timer.
+        """
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None or duel_data['status'] != 'active':
+                return None
+            
+            if duel_data.get('round_started') == duel_data['round_number']:
+                return None
+            duel_data['round_started'] = duel_data['round_number']
+            
+            # Questions were generated when the duel was created
+            a, operation, b = duel_data['questions'][duel_data['round_number'] - 1]
+            question = f'{a} {operation} {b}'
+            answer = compute_answer(a, operation, b)
+            
+            duel_data['current_question'] = question
+            duel_data['current_answer'] = answer
+            duel_data['question_start_time'] = datetime.utcnow()
+            duel_data['answered'] = set()
+            duel_data['last_activity'] = time.time()
+            self._save(room_id, duel_data)
         
         return {
             'question': question,
-            'answer': answer,
             'round': duel_data['round_number'],
             'time_limit': duel_data['time_limit']
         }
     
-    def submit_answer(self, room_id, user_id, answer, response_time):
-        """Submit an answer and return result"""
-        if room_id not in self.active_duels:
-            return None
-        
-        duel_data = self.active_duels[room_id]
-        if duel_data['status'] != 'active':
-            return None
-        
-        if user_id not in duel_data['scores']:
+    def get_questions(self, room_id):
+        """All of a duel's question texts, sent ahead of time and revealed by round"""
+        duel_data = self.store.get(room_id)
+        if duel_data is None:
             return None
-        
-        # Check if answer is correct
-        is_correct = answer == duel_data['current_answer']
-        
-        # Calculate points based on speed and correctness
-        points = 0
-        if is_correct:
-            time_taken = response_time
-            if time_taken < 5:
-                points = 100
-            elif time_taken < 10:
-                points = 75
-            elif time_taken < 15:
-                points = 50
-            else:
-                points = 25
+        return [f'{a} {op} {b}' for a, op, b in duel_data['questions']]
+    
+    def submit_answer(self, room_id, user_id, answer, network_delay=0.0):
+        """Submit an answer and return result (memory only; persisted with the journal)
+
+        Response time is measured on the server, from the question's emit to the
+        answer's arrival, minus the player's estimated network round trip.
+        """
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None or duel_data['status'] != 'active':
+                return None
             
-            duel_data['scores'][user_id] += points
-        
-        # Update database
-        duel_score = DuelScore.query.filter_by(
-            duel_id=duel_data['duel_id'],
-            user_id=user_id
-        ).first()
-        
-        if duel_score:
-            duel_score.total_answers += 1
-            if is_correct:
-                duel_score.correct_answers += 1
-                duel_score.score += points
+            if (user_id not in duel_data['scores'] or user_id in duel_data['answered']
+                    or user_id in duel_data['forfeited']):
+                return None
             
-            # Update average response time
-            if duel_score.average_response_time == 0:
-                duel_score.average_response_time = response_time
-            else:
-                duel_score.average_response_time = (
-                    (duel_score.average_response_time + response_time) / 2
-                )
+            # No round is running: the room has just filled or been recovered,
+            # or the last round ended and the next has not started yet
+            if duel_data['question_start_time'] is None:
+                return None
             
-            db.session.commit()
+            # Answers after the round's time limit are not accepted
+            elapsed = (datetime.utcnow() - duel_data['question_start_time']).total_seconds()
+            response_time = max(0.0, elapsed - network_delay)
+            if response_time > duel_data['time_limit']:
+                return None
+            duel_data['answered'].add(user_id)
+            
+            # Check if answer is correct
+            is_correct = answer == duel_data['current_answer']
+            
+            # Calculate points based on speed and correctness
+            points = 0
+            if is_correct:
+                time_taken = response_time
+                if time_taken < 5:
+                    points = 100
+                elif time_taken < 10:
+                    points = 75
+                elif time_taken < 15:
+                    points = 50
+                else:
+                    points = 25
+                
+                duel_data['scores'][user_id] += points
+            
+            duel_data['journal'].append(
+                ['a', duel_data['round_number'], user_id, int(is_correct), points, round(response_time, 3)]
+            )
+            duel_data['last_activity'] = time.time()
+            self._save(room_id, duel_data)
         
         return {
             'correct': is_correct,
             'points': points,
             'total_score': duel_data['scores'][user_id],
-            'response_time': response_time
+            'response_time': round(response_time, 3),
+            'network_delay': round(network_delay, 3)
         }
     
-    def end_round(self, room_id):
-        """End current round and prepare for next"""
-        if room_id not in self.active_duels:
-            return None
-        
-        duel_data = self.active_duels[room_id]
-        duel_data['round_number'] += 1
-        
-        # Check if duel is complete
-        if duel_data['round_number'] > duel_data['max_rounds']:
-            return self.end_duel(room_id)
+    def all_answered(self, room_id):
+        """Whether every connected player has answered the current round"""
+        duel_data = self.store.get(room_id)
+        return bool(duel_data) and duel_data['answered'] >= set(self.active_players(duel_data))
+    
+    def end_round(self, room_id, expected_round=None):
+        """End current round and prepare for next
+
+        With expected_round, the round only ends if it is still the current
+        one, so duplicate timers on different workers advance it once.
+        """
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None:
+                return None
+            
+            if expected_round is not None and duel_data['round_number'] != expected_round:
+                return None
+            
+            duel_data['journal'].append(['r', duel_data['round_number']])
+            duel_data['round_number'] += 1
+            duel_data['question_start_time'] = None
+            
+            # Check if duel is complete
+            if duel_data['round_number'] > duel_data['max_rounds']:
+                return self._finish(room_id, duel_data)
+            
+            if self.checkpoint_rounds and (duel_data['round_number'] - 1) % self.checkpoint_rounds == 0:
+                self._checkpoint(room_id, duel_data)
+            
+            self._save(room_id, duel_data)
         
         return {
             'round': duel_data['round_number'],
@@ -377,41 +524,662 @@ class DuelManager:
     
     def end_duel(self, room_id):
         """End the duel and return final results"""
-        if room_id not in self.active_duels:
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None:
+                return None
+            return self._finish(room_id, duel_data)
+    
+    def _save(self, room_id, duel_data):
+        duel_data['version'] = duel_data.get('version', 0) + 1
+        self.store.save(room_id, duel_data)
+    
+    def _checkpoint(self, room_id, duel_data):
+        """Persist the journal so the duel can be rebuilt after a crash"""
+        duel = Duel.query.filter_by(room_id=room_id).first()
+        if duel:
+            duel.journal = json.dumps(duel_data['journal'], separators=(',', ':'))
+            db.session.commit()
+    
+    def set_connected(self, room_id, user_id, connected):
+        """Record a player (re)connecting to or dropping from a duel room"""
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None or user_id not in duel_data['scores']:
+                return
+            if connected:
+                duel_data['disconnected'].pop(user_id, None)
+            else:
+                duel_data['disconnected'][user_id] = time.time()
+            self._save(room_id, duel_data)
+    
+    def forfeit(self, room_id, user_id):
+        """Drop a player from a duel.
+
+        Returns the duel's final result if that ends it (the host leaves before
+        the start, or fewer than two players remain), otherwise None.
+        """
+        with self.store.lock(room_id):
+            duel_data = self.store.get(room_id)
+            if duel_data is None or user_id not in duel_data['scores']:
+                return None
+            result = self._drop_players(room_id, duel_data, [user_id])
+            if result is None:
+                self._save(room_id, duel_data)
+            return result
+    
+    def _drop_players(self, room_id, duel_data, user_ids):
+        """Remove players from a waiting room or forfeit them from a running duel (lock held)"""
+        if duel_data['status'] == 'waiting':
+            if duel_data['host_id'] in user_ids:
+                return self._close(room_id, duel_data)
+            duel = Duel.query.filter_by(room_id=room_id).first()
+            if duel:
+                DuelParticipant.query.filter(
+                    DuelParticipant.duel_id == duel.id, DuelParticipant.user_id.in_(user_ids)
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            for user_id in user_ids:
+                duel_data['scores'].pop(user_id, None)
+                duel_data['disconnected'].pop(user_id, None)
+                if self.store.get_player_room(user_id) == room_id:
+                    self.store.clear_player_room(user_id)
             return None
         
-        duel_data = self.active_duels[room_id]
+        for user_id in user_ids:
+            if user_id not in duel_data['forfeited']:
+                duel_data['forfeited'].add(user_id)
+                duel_data['journal'].append(['f', duel_data['round_number'], user_id])
+        remaining = [user_id for user_id in duel_data['scores'] if user_id not in duel_data['forfeited']]
+        if len(remaining) < 2:
+            return self._finish(
+                room_id, duel_data,
+                winner_id=remaining[0] if remaining else None,
+                forfeited_by=user_ids[0]
+            )
+        return None
+    
+    def sweep(self, waiting_ttl, active_ttl, disconnect_grace, now=None):
+        """Close idle or abandoned duels and return [(room_id, result), ...]
+
+        - waiting duels that don't start within waiting_ttl seconds expire
+        - players gone for disconnect_grace seconds forfeit; the duel ends once
+          fewer than two players remain
+        - active duels with no activity for active_ttl seconds end on current scores
+        """
+        now = now or time.time()
+        evicted = []
+        for room_id in self.store.room_ids():
+            with self.store.lock(room_id):
+                duel_data = self.store.get(room_id)
+                if duel_data is None:
+                    continue
+                idle = now - duel_data['last_activity']
+                gone = [user_id for user_id, since in duel_data['disconnected'].items() if now - since > disconnect_grace]
+                
+                if duel_data['status'] == 'waiting' and idle > waiting_ttl:
+                    evicted.append((room_id, self._close(room_id, duel_data)))
+                elif gone:
+                    for user_id in gone:
+                        del duel_data['disconnected'][user_id]
+                    result = self._drop_players(room_id, duel_data, gone)
+                    if result is None:
+                        self._save(room_id, duel_data)
+                    else:
+                        evicted.append((room_id, result))
+                elif duel_data['status'] == 'active' and idle > active_ttl:
+                    evicted.append((room_id, self._finish(room_id, duel_data)))
+        
+        # Duels left behind in the database by a previous process
+        cutoff = datetime.utcnow() - timedelta(seconds=max(waiting_ttl, active_ttl))
+        live = set(self.store.room_ids())
+        stale = Duel.query.filter(Duel.status.in_(['waiting', 'active']), Duel.created_at < cutoff).all()
+        for duel in stale:
+            if duel.room_id not in live:
+                duel.status = 'expired'
+                duel.completed_at = datetime.utcnow()
+                self.metrics['duels_expired'] += 1
+        if stale:
+            db.session.commit()
+        
+        return evicted
+    
+    def _close(self, room_id, duel_data):
+        """Expire a duel that never started"""
+        duel = Duel.query.filter_by(room_id=room_id).first()
+        if duel:
+            duel.status = 'expired'
+            duel.completed_at = datetime.utcnow()
+            db.session.commit()
+        
+        for user_id in duel_data['scores']:
+            if self.store.get_player_room(user_id) == room_id:
+                self.store.clear_player_room(user_id)
+        
+        self.store.delete(room_id)
+        self.metrics['duels_expired'] += 1
+        return {'status': 'expired'}
+    
+    def _finish(self, room_id, duel_data, winner_id=None, forfeited_by=None):
+        # Fold the journal into per-player results and write everything in one commit
+        totals = {user_id: [0, 0, 0, 0.0] for user_id in duel_data['scores']}  # score, correct, answers, time
+        for entry in duel_data['journal']:
+            if entry[0] == 'a':
+                _, _, user_id, correct, points, response_time = entry
+                total = totals.setdefault(user_id, [0, 0, 0, 0.0])
+                total[0] += points
+                total[1] += correct
+                total[2] += 1
+                total[3] += response_time
         
-        # Update database
         duel = Duel.query.filter_by(room_id=room_id).first()
         if duel:
             duel.status = 'completed'
             duel.completed_at = datetime.utcnow()
+            duel.round_number = duel_data['round_number'] - 1
+            duel.journal = json.dumps(duel_data['journal'], separators=(',', ':'))
+            # One score row per participant, written together
+            duel_scores = {duel_score.user_id: duel_score for duel_score in DuelScore.query.filter_by(duel_id=duel.id)}
+            for user_id, (score, correct, answers, response_time_sum) in totals.items():
+                duel_score = duel_scores.get(user_id)
+                if duel_score is None:
+                    duel_score = DuelScore(duel_id=duel.id, user_id=user_id)
+                    db.session.add(duel_score)
+                duel_score.score = score
+                duel_score.correct_answers = correct
+                duel_score.total_answers = answers
+                duel_score.average_response_time = response_time_sum / answers if answers else 0.0
             db.session.commit()
         
-        # Determine winner
+        # Determine winner among the players who didn't forfeit
         scores = duel_data['scores']
-        winner_id = max(scores, key=scores.get) if scores else None
+        if winner_id is None and forfeited_by is None:
+            contenders = [user_id for user_id in scores if user_id not in duel_data['forfeited']]
+            winner_id = max(contenders, key=scores.get) if contenders else None
         
-        # Clean up memory
-        for user_id in [duel_data['player1_id'], duel_data['player2_id']]:
-            if user_id in self.player_rooms:
-                del self.player_rooms[user_id]
+        # Clean up state
+        for user_id in scores:
+            if self.store.get_player_room(user_id) == room_id:
+                self.store.clear_player_room(user_id)
         
         result = {
             'status': 'completed',
             'winner': winner_id,
             'final_scores': scores,
+            'standings': [user_id for user_id, _ in sorted(scores.items(), key=lambda item: -item[1])],
             'total_rounds': duel_data['round_number'] - 1
         }
+        if forfeited_by is not None:
+            result['forfeited_by'] = forfeited_by
+            self.metrics['duels_forfeited'] += 1
+        else:
+            self.metrics['duels_completed'] += 1
         
-        del self.active_duels[room_id]
+        self.store.delete(room_id)
         return result
+    
+    def recover(self):
+        """Rebuild active duels missing from the store from their persisted journals"""
+        restored = 0
+        for duel in Duel.query.filter_by(status='active').all():
+            if self.store.get(duel.room_id) is not None:
+                continue
+            if duel.questions:
+                questions = json.loads(duel.questions)
+            else:
+                questions = [[a, op, b] for a, op, b, _ in balanced_question_set(duel.question_seed, duel.max_rounds)]
+            duel_data = new_duel_state(
+                duel.id, duel.player1_id, duel.time_limit, duel.max_rounds, duel.question_seed, questions,
+                duel.max_players or 2
+            )
+            duel_data['status'] = 'active'
+            participants = [participant.user_id for participant in
+                            DuelParticipant.query.filter_by(duel_id=duel.id).order_by(DuelParticipant.id)]
+            # Duels from before the participant table only have the player columns
+            for user_id in participants or [duel.player1_id, duel.player2_id]:
+                if user_id is not None:
+                    duel_data['scores'][user_id] = 0
+            replay_journal(duel_data, json.loads(duel.journal) if duel.journal else [])
+            duel_data['last_activity'] = time.time()
+            # Continue past any version a status client saw before the restart
+            duel_data['version'] = int(time.time() * 1000)
+            self._save(duel.room_id, duel_data)
+            for user_id in duel_data['scores']:
+                self.store.set_player_room(user_id, duel.room_id)
+            restored += 1
+        return restored
 
 # Global duel manager instance
-duel_manager = DuelManager()
+duel_manager = DuelManager(
+    create_duel_store(app),
+    checkpoint_rounds=app.config['DUEL_CHECKPOINT_ROUNDS'],
+    max_duels=app.config['MAX_ACTIVE_DUELS']
+)
+
+# Which user and duel room each Socket.IO connection on this worker belongs to
+duel_connections = ConnectionIndex()
+
+# Rounds advance from the scheduler's background task, never inside a handler
+round_scheduler = RoundScheduler(socketio)
+
+# Duel events go out once per tick per room, as JSON or compact binary frames
+duel_wire = DuelWire(socketio, app.config['DUEL_WIRE_INTERVAL'])
+
+# Answers update standings; each room gets at most one 'standings' emit per tick
+standings_broadcaster = RoomBroadcaster(
+    socketio, 'standings', duel_manager.standings, app.config['DUEL_BROADCAST_INTERVAL'], emit=duel_wire.emit
+)
+
+def spectator_snapshot(room_id):
+    snapshot = duel_manager.snapshot(room_id)
+    if snapshot is not None:
+        snapshot['spectators'] = spectator_feed.spectators(room_id)
+    return snapshot
+
+# Spectators get one shared delta per watched duel per tick
+spectator_feed = SpectatorFeed(socketio, spectator_snapshot, app.config['SPECTATOR_INTERVAL'])
+
+def begin_round(room_id, send_questions=False):
+    """Start the next round and arm its server-side time limit"""
+    round_data = duel_manager.start_round(room_id)
+    if round_data:
+        if send_questions:
+            # The whole question set goes out up front; clients reveal it round by round
+            socketio.emit('duel_questions', {'questions': duel_manager.get_questions(room_id)}, room=room_id)
+        duel_wire.emit('round_started', round_data, room=room_id)
+        # Answer times run from question_start_time, so send the question now
+        # instead of after up to a tick in the queue; everything else queued
+        # goes too, so earlier answer results still arrive first
+        duel_wire.flush()
+        round_scheduler.schedule(
+            room_id,
+            round_data['time_limit'],
+            functools.partial(advance_duel, round_number=round_data['round'])
+        )
+        print(f'Round started in duel {room_id}: {round_data["question"]}')
+
+def advance_duel(room_id, round_number=None):
+    """Scheduler callback: close the current round, then start the next or finish the duel"""
+    with app.app_context():
+        round_result = duel_manager.end_round(room_id, expected_round=round_number)
+        if not round_result:
+            return
+        if round_result.get('status') == 'completed':
+            close_duel_room(room_id, round_result)
+        else:
+            begin_round(room_id)
+
+# Per-connection RTT, measured by pinging every duel room
+latency_tracker = LatencyTracker(app.config['LATENCY_MAX_COMPENSATION'])
+
+def ping_duel_rooms():
+    """Background task: one latency ping per duel room with connected players"""
+    while True:
+        socketio.sleep(app.config['LATENCY_PING_INTERVAL'])
+        rooms = {room_id for _, room_id in duel_connections.users}
+        # Forget rooms whose duel is gone, e.g. closed by another worker
+        for room_id in [room_id for room_id in rooms if duel_manager.get_duel(room_id) is None]:
+            duel_connections.drop_room(room_id)
+            latency_tracker.drop_room(room_id)
+            rooms.discard(room_id)
+        if rooms:
+            seq = latency_tracker.ping()
+            for room_id in rooms:
+                socketio.emit('latency_ping', {'seq': seq}, room=room_id)
+
+latency_pinger_started = False
+
+def ensure_latency_pinger():
+    global latency_pinger_started
+    if not latency_pinger_started:
+        latency_pinger_started = True
+        socketio.start_background_task(ping_duel_rooms)
+
+def close_duel_room(room_id, result):
+    """Tell a room its duel is over and free the Socket.IO room"""
+    round_scheduler.cancel(room_id)
+    standings_broadcaster.discard(room_id)
+    spectator_feed.end(room_id, result)
+    duel_wire.emit('duel_ended', result, room=room_id)
+    duel_wire.close_room(room_id)
+    socketio.close_room(room_id)
+    duel_connections.drop_room(room_id)
+    latency_tracker.drop_room(room_id)
+
+def sweep_duels():
+    """Background task: evict idle, abandoned and never-started duels"""
+    while True:
+        socketio.sleep(app.config['DUEL_SWEEP_INTERVAL'])
+        with app.app_context():
+            try:
+                evicted = duel_manager.sweep(
+                    waiting_ttl=app.config['DUEL_WAITING_TTL'],
+                    active_ttl=app.config['DUEL_ACTIVE_TTL'],
+                    disconnect_grace=app.config['DUEL_DISCONNECT_GRACE']
+                )
+                for room_id, result in evicted:
+                    close_duel_room(room_id, result)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Duel sweep error: {e}")
+
+duel_sweeper_started = False
+
+def ensure_duel_sweeper():
+    global duel_sweeper_started
+    if not duel_sweeper_started:
+        duel_sweeper_started = True
+        socketio.start_background_task(sweep_duels)
+
+def socket_user_id():
+    """The logged-in user behind a Socket.IO event; a user_id sent by the client is never trusted"""
+    return session.get('user_id')
+
+# Skill-based matchmaking; the queue lives in this process
+matchmaking = MatchmakingQueue(
+    base_spread=app.config['MATCHMAKING_BASE_SPREAD'],
+    spread_per_second=app.config['MATCHMAKING_SPREAD_PER_SECOND'],
+    max_spread=app.config['MATCHMAKING_MAX_SPREAD']
+)
+matchmaking_sids = {}  # {sid: user_id} for players queued over Socket.IO
+
+def player_rating(user_id):
+    """Skill rating in [0, 2000] from practice accuracy and duel points; 1000 with no history"""
+    correct, attempts = db.session.query(
+        func.sum(Progress.correct_answers), func.sum(Progress.total_attempts)
+    ).filter(Progress.user_id == user_id).one()
+    points, answers = db.session.query(
+        func.sum(DuelScore.score), func.sum(DuelScore.total_answers)
+    ).filter(DuelScore.user_id == user_id).one()
+    
+    signals = []
+    if attempts:
+        signals.append(correct / attempts)
+    if answers:
+        signals.append(points / (answers * 100))  # 100 points is a fast correct answer
+    if not signals:
+        return 1000
+    return round(2000 * sum(signals) / len(signals))
+
+def user_room(user_id):
+    """Socket.IO room that reaches every connection of one user"""
+    return f'user:{user_id}'
+
+def start_match(player, opponent):
+    """Create a duel for two matched queue entries and notify both players"""
+    room_id = duel_manager.create_duel(player.user_id)
+    if room_id is None:
+        for entry in (player, opponent):
+            socketio.emit('match_error', {'error': 'Too many active duels, try again shortly'}, room=user_room(entry.user_id))
+        return None
+    duel_manager.join_duel(room_id, opponent.user_id)
+    ensure_duel_sweeper()
+    
+    now = time.time()
+    for entry, other in ((player, opponent), (opponent, player)):
+        socketio.emit('match_found', {
+            'room_id': room_id,
+            'opponent_id': other.user_id,
+            'opponent_rating': other.rating,
+            'wait_time': round(now - entry.enqueued_at, 3)
+        }, room=user_room(entry.user_id))
+    return room_id
+
+def find_match(user_id):
+    """Queue a player, pairing them at once if a close opponent is waiting.
+
+    Returns (room_id, rating, error); room_id is None while the player waits.
+    """
+    if duel_manager.store.get_player_room(user_id):
+        return None, None, 'Already in a duel'
+    ensure_matchmaker()
+    
+    rating = player_rating(user_id)
+    now = time.time()
+    opponent = matchmaking.enqueue(user_id, rating, now)
+    if opponent is None:
+        return None, rating, None
+    room_id = start_match(opponent, QueueEntry(rating, now, user_id))
+    if room_id is None:
+        return None, rating, 'Too many active duels, try again shortly'
+    return room_id, rating, None
+
+def run_matchmaking():
+    """Background task: pair players whose search ranges have widened and drop abandoned entries"""
+    while True:
+        socketio.sleep(app.config['MATCHMAKING_INTERVAL'])
+        if not len(matchmaking):
+            continue
+        with app.app_context():
+            try:
+                for entry in matchmaking.expire(app.config['MATCHMAKING_TIMEOUT']):
+                    socketio.emit('match_cancelled', {'reason': 'timeout'}, room=user_room(entry.user_id))
+                for player, opponent in matchmaking.match():
+                    start_match(player, opponent)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Matchmaking error: {e}")
+
+matchmaker_started = False
+
+def ensure_matchmaker():
+    global matchmaker_started
+    if not matchmaker_started:
+        matchmaker_started = True
+        socketio.start_background_task(run_matchmaking)
+
+# Ranked leaderboard indexes, one per time window: pages, totals and ranks are served from memory
+LEADERBOARD_MODES = ('standard', 'marathon')
+LEADERBOARD_WINDOWS = ('all', 'daily', 'weekly')
+leaderboard_indexes = {window: LeaderboardIndex(LEADERBOARD_MODES) for window in LEADERBOARD_WINDOWS}
+leaderboard_periods = {}  # {window: period_start this worker's daily/weekly board is on}
+leaderboard_version = 0   # bumped whenever a board changes; part of the leaderboard ETags
+# The counter is per process, so two workers can reach the same value with
+# different boards; this id keeps their ETags apart
+leaderboard_boot_id = uuid.uuid4().hex[:8]
+
+def bump_leaderboard_version():
+    global leaderboard_version
+    leaderboard_version += 1
+
+def period_start(window, now=None):
+    """First day (UTC) of the current daily or weekly period; None for the all-time board"""
+    today = (now or datetime.utcnow()).date()
+    if window == 'daily':
+        return today
+    if window == 'weekly':
+        return today - timedelta(days=today.weekday())
+    return None
+
+def roll_leaderboard_window(window):
+    """Move a daily/weekly board to the current period once the day or week turns over.
+
+    Buckets from earlier periods are deleted and the window's index is emptied,
+    so reads never filter or aggregate old history. Returns the current period_start.
+    """
+    start = period_start(window)
+    if start is not None and leaderboard_periods.get(window) != start:
+        LeaderboardPeriodScore.query.filter(
+            LeaderboardPeriodScore.period == window,
+            LeaderboardPeriodScore.period_start < start
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        leaderboard_indexes[window].loaded = False
+        leaderboard_periods[window] = start
+    return start
+
+def leaderboard_scope(window):
+    """The table behind a window and the WHERE clauses selecting its current period"""
+    if window == 'all':
+        return LeaderboardScore, []
+    return LeaderboardPeriodScore, [
+        LeaderboardPeriodScore.period == window,
+        LeaderboardPeriodScore.period_start == roll_leaderboard_window(window)
+    ]
+
+def leaderboard_rows(window='all', since=None):
+    """(user_id, mode, score, created_at, username) for every best score, or those written since `since`"""
+    model, scope = leaderboard_scope(window)
+    query = select(model.user_id, model.mode, model.score, model.created_at, User.username)\
+        .join(User, User.id == model.user_id)\
+        .where(*scope)
+    if since is not None:
+        query = query.where(model.created_at >= since)
+    return db.session.execute(query.execution_options(yield_per=10000))
+
+def ensure_leaderboard_index(window='all'):
+    """Load a window's leaderboard index on first use and pick up scores other workers wrote.
+
+    Returns False when the index is disabled and queries should hit the database.
+    """
+    if not app.config['LEADERBOARD_INDEX_ENABLED']:
+        return False
+    roll_leaderboard_window(window)
+    index = leaderboard_indexes[window]
+    now = datetime.utcnow()
+    interval = timedelta(seconds=app.config['LEADERBOARD_SYNC_INTERVAL'])
+    if not index.loaded:
+        index.load(leaderboard_rows(window), synced_at=now)
+        bump_leaderboard_version()
+    elif interval and now - index.synced_at >= interval:
+        # Overlap the previous window so rows committed just after it aren't missed
+        if index.sync(leaderboard_rows(window, since=index.synced_at - interval), synced_at=now):
+            bump_leaderboard_version()
+    return True
+
+def leaderboard_etag(mode):
+    """ETag for a leaderboard read from the version counter and the request.
+
+    Brings the index up to date first (first load, periodic sync, or rolling a
+    daily/weekly board over, which deletes the old period's rows) so the
+    version matches what the view serves; otherwise it runs no queries.
+    """
+    window = request.args.get('window', 'all')
+    if mode not in LEADERBOARD_MODES or window not in LEADERBOARD_WINDOWS:
+        return None
+    version = leaderboard_version if ensure_leaderboard_index(window) else (
+        # Without the index other workers' scores go unseen, so let the ETag age out
+        leaderboard_version, int(time.time() // max(app.config['LEADERBOARD_SYNC_INTERVAL'], 1))
+    )
+    return etag_for(
+        'leaderboard', leaderboard_boot_id, version, period_start(window), session.get('user_id'), request.full_path
+    )
+
+def leaderboard_after(key, model=LeaderboardScore):
+    """WHERE clause for rows ranked below `key` in (score DESC, created_at ASC NULLS FIRST, user_id ASC) order"""
+    score, created_at, user_id = -key.neg_score, key.created_at, key.user_id
+    if created_at == NO_TIMESTAMP:
+        ties = or_(model.created_at.isnot(None), model.user_id > user_id)
+    else:
+        ties = or_(
+            model.created_at > created_at,
+            and_(model.created_at == created_at, model.user_id > user_id)
+        )
+    # The redundant score <= bound lets the database seek on the index instead of scanning
+    return and_(
+        model.score <= score,
+        or_(model.score < score, and_(model.score == score, ties))
+    )
+
+def leaderboard_ahead(key, model=LeaderboardScore):
+    """WHERE clause for rows ranked above `key`; the mirror image of leaderboard_after"""
+    score, created_at, user_id = -key.neg_score, key.created_at, key.user_id
+    if created_at == NO_TIMESTAMP:
+        ties = and_(model.created_at.is_(None), model.user_id < user_id)
+    else:
+        ties = or_(
+            model.created_at.is_(None),
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.user_id < user_id)
+        )
+    return and_(
+        model.score >= score,
+        or_(model.score > score, and_(model.score == score, ties))
+    )
+
+def leaderboard_page(mode, limit, first_rank, offset=0, after=None, before=None, window='all'):
+    """One page of the leaderboard from the database, usernames joined in the same query.
+
+    With `before`, returns the `limit` entries just above that key, still best
+    first, and `first_rank` is the rank of `before` itself.
+    """
+    model, scope = leaderboard_scope(window)
+    query = select(model.user_id, User.username, model.score, model.created_at)\
+        .join(User, User.id == model.user_id)\
+        .where(model.mode == mode, *scope)
+    order = [
+        model.score.desc(),
+        model.created_at.asc().nulls_first(),
+        model.user_id.asc()
+    ]
+    if after is not None:
+        # Seek past the cursor along the (mode, score) index instead of skipping rows
+        query = query.where(leaderboard_after(after, model))
+    if before is not None:
+        # Walk upwards from the key and flip the rows back into ranking order
+        query = query.where(leaderboard_ahead(before, model))
+        order = [
+            model.score.asc(),
+            model.created_at.desc().nulls_last(),
+            model.user_id.desc()
+        ]
+    rows = list(db.session.execute(query.order_by(*order).offset(offset).limit(limit)))
+    if before is not None:
+        rows.reverse()
+        first_rank -= len(rows)
+    return [{
+        'rank': rank,
+        'user_id': user_id,
+        'username': username,
+        'score': score,
+        'created_at': created_at.isoformat() if created_at else None
+    } for rank, (user_id, username, score, created_at) in enumerate(rows, first_rank)]
+
+def leaderboard_around(mode, user_id, k, window='all'):
+    """(rank, entries) for a user and up to `k` entries either side, from the database.
+
+    The rank is one COUNT over the index range of higher scores, not a scan.
+    """
+    model, scope = leaderboard_scope(window)
+    row = db.session.execute(
+        select(User.username, model.score, model.created_at)
+        .join(User, User.id == model.user_id)
+        .where(model.mode == mode, model.user_id == user_id, *scope)
+    ).first()
+    if row is None:
+        return None, []
+    key = entry_key(row.score, row.created_at, user_id)
+    rank = db.session.scalar(
+        select(func.count()).where(model.mode == mode, leaderboard_ahead(key, model), *scope)
+    ) + 1
+    own = {
+        'rank': rank,
+        'user_id': user_id,
+        'username': row.username,
+        'score': row.score,
+        'created_at': row.created_at.isoformat() if row.created_at else None
+    }
+    above = leaderboard_page(mode, k, rank, before=key, window=window)
+    below = leaderboard_page(mode, k, rank + 1, after=key, window=window)
+    return rank, above + [own] + below
+
+leaderboard_counts = {}  # {(mode, window, period_start): (total, monotonic time counted)}
+
+def leaderboard_total(mode, window='all'):
+    """Number of scores on a board: exact from the index, else a COUNT(*) cached for LEADERBOARD_COUNT_TTL"""
+    index = leaderboard_indexes[window]
+    if app.config['LEADERBOARD_INDEX_ENABLED'] and index.loaded:
+        return index.total(mode)
+    model, scope = leaderboard_scope(window)
+    key = (mode, window, leaderboard_periods.get(window))
+    cached = leaderboard_counts.get(key)
+    if cached is None or time.monotonic() - cached[1] >= app.config['LEADERBOARD_COUNT_TTL']:
+        total = db.session.scalar(select(func.count()).where(model.mode == mode, *scope))
+        cached = leaderboard_counts[key] = (total, time.monotonic())
+    return cached[0]
 
 @app.route('/')
+@static_page('menu.html')
 def menu():
     return render_template('menu.html')
 
@@ -425,10 +1193,17 @@ def setup_database():
     try:
         with app.app_context():
             db.create_all()
+            problems = schema_problems()
+            if problems:
+                return jsonify({
+                    'status': 'error',
+                    'message': "Existing tables are out of date, run 'python migrate_db.py upgrade'",
+                    'problems': problems
+                }), 500
             return jsonify({
                 'status': 'success',
                 'message': 'Database initialized successfully',
-                'tables': ['User', 'Progress', 'Analytics', 'LearningPath', 'LeaderboardScore', 'Duel', 'DuelScore']
+                'tables': ['User', 'Progress', 'Analytics', 'LearningPath', 'LeaderboardScore', 'LeaderboardPeriodScore', 'Duel', 'DuelParticipant', 'DuelScore']
             })
     except Exception as e:
         return jsonify({
@@ -441,18 +1216,30 @@ def setup_database():
 def duel():
     if 'user_id' not in session:
         return redirect(url_for('menu'))
-    return render_template('duel.html')
+    return render_template('duel.html', user_id=session['user_id'], max_players=app.config['DUEL_MAX_PLAYERS'])
 
 @app.route('/api/duel/create', methods=['POST'])
 def create_duel():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
     
-    data = request.json
+    data = request.get_json(silent=True) or {}
     time_limit = data.get('time_limit', 30)
     max_rounds = data.get('max_rounds', 10)
+    max_players = data.get('max_players', 2)
+    # Bounded so a request can't fail on bad types or tie up the worker generating questions
+    for name, value, low, high in (
+        ('time_limit', time_limit, app.config['DUEL_MIN_TIME_LIMIT'], app.config['DUEL_MAX_TIME_LIMIT']),
+        ('max_rounds', max_rounds, 1, app.config['DUEL_MAX_ROUNDS']),
+        ('max_players', max_players, 2, app.config['DUEL_MAX_PLAYERS'])
+    ):
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            return jsonify({'error': f'{name} must be an integer between {low} and {high}'}), 400
     
-    room_id = duel_manager.create_duel(session['user_id'], time_limit, max_rounds)
+    room_id = duel_manager.create_duel(session['user_id'], time_limit, max_rounds, max_players)
+    if room_id is None:
+        return jsonify({'error': 'Too many active duels, try again shortly'}), 503
+    ensure_duel_sweeper()
     
     return jsonify({
         'room_id': room_id,
@@ -471,122 +1258,298 @@ def join_duel(room_id):
     else:
         return jsonify({'error': message}), 400
 
+@app.route('/api/matchmaking/join', methods=['POST'])
+def join_matchmaking():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    room_id, rating, error = find_match(session['user_id'])
+    if error:
+        return jsonify({'error': error}), 400
+    if room_id:
+        return jsonify({'status': 'matched', 'room_id': room_id, 'rating': rating})
+    return jsonify({'status': 'queued', 'rating': rating, 'queue_size': len(matchmaking)})
+
+@app.route('/api/matchmaking/status')
+def get_matchmaking_status():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    user_id = session['user_id']
+    if user_id in matchmaking:
+        return jsonify({
+            'status': 'queued',
+            'wait_time': round(matchmaking.wait_time(user_id), 3),
+            'queue_size': len(matchmaking)
+        })
+    room_id = duel_manager.store.get_player_room(user_id)
+    if room_id:
+        return jsonify({'status': 'matched', 'room_id': room_id})
+    return jsonify({'status': 'idle'})
+
+@app.route('/api/matchmaking/leave', methods=['POST'])
+def leave_matchmaking():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    matchmaking.dequeue(session['user_id'])
+    return jsonify({'status': 'idle'})
+
+@app.route('/api/duel/metrics')
+def get_duel_metrics():
+    live = [duel_manager.get_duel(room_id) for room_id in duel_manager.store.room_ids()]
+    live = [duel_data for duel_data in live if duel_data]
+    return jsonify({
+        'live_rooms': len(live),
+        'waiting_rooms': sum(1 for duel_data in live if duel_data['status'] == 'waiting'),
+        'active_rooms': sum(1 for duel_data in live if duel_data['status'] == 'active'),
+        'max_rooms': duel_manager.max_duels,
+        'connections': len(duel_connections),
+        'pending_timers': len(round_scheduler.timers),
+        **duel_manager.metrics
+    })
+
+@app.route('/api/latency')
+def get_latency():
+    return jsonify({
+        'global': latency_tracker.histogram.to_dict(),
+        'connections': len(latency_tracker.connections),
+        'rooms': {room_id: histogram.to_dict() for room_id, histogram in latency_tracker.rooms.items()}
+    })
+
+@app.route('/api/duel/<room_id>/latency')
+def get_duel_latency(room_id):
+    histogram = latency_tracker.rooms.get(room_id)
+    players = {
+        user_id: latency_tracker.estimate(sid)
+        for sid, (user_id, bound_room) in duel_connections.sids.items() if bound_room == room_id
+    }
+    if histogram is None and not players:
+        return jsonify({'error': 'No latency data for this duel'}), 404
+    return jsonify({
+        'histogram': histogram.to_dict() if histogram else None,
+        'players': players
+    })
+
+def duel_status_etag(room_id):
+    version = duel_manager.version(room_id)
+    if version is None:
+        return None
+    return etag_for('duel', room_id, version, spectator_feed.spectators(room_id))
+
 @app.route('/api/duel/<room_id>/status')
+@conditional('no-cache', duel_status_etag)
 def get_duel_status(room_id):
-    if room_id not in duel_manager.active_duels:
+    snapshot = spectator_snapshot(room_id)
+    if snapshot is None:
         return jsonify({'error': 'Duel not found'}), 404
     
-    duel_data = duel_manager.active_duels[room_id]
-    return jsonify({
-        'status': duel_data['status'],
-        'player1_id': duel_data['player1_id'],
-        'player2_id': duel_data['player2_id'],
-        'scores': duel_data['scores'],
-        'round': duel_data['round_number'],
-        'max_rounds': duel_data['max_rounds']
-    })
+    return jsonify(snapshot)
 
 # WebSocket Event Handlers
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     print(f'Client connected: {request.sid}')
-    emit('connected', {'message': 'Connected to server'})
+    # Clients may ask for compact binary duel events: io({auth: {format: 'binary'}})
+    wire_format = duel_wire.negotiate(request.sid, (auth or {}).get('format'))
+    emit('connected', {'message': 'Connected to server', 'format': wire_format})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f'Client disconnected: {request.sid}')
-    # Clean up if user was in a duel
-    # This would need more sophisticated user tracking
+    latency_tracker.forget(request.sid)
+    duel_wire.forget(request.sid)
+    spectator_feed.unwatch(request.sid)
+    queued_user = matchmaking_sids.pop(request.sid, None)
+    if queued_user is not None:
+        matchmaking.dequeue(queued_user)
+    
+    binding = duel_connections.unbind(request.sid)
+    if binding is None:
+        return
+    
+    # The sweeper forfeits the player if they don't reconnect within the grace period
+    user_id, room_id = binding
+    if not duel_connections.is_connected(user_id, room_id):
+        duel_manager.set_connected(room_id, user_id, False)
+        emit('player_left', {
+            'user_id': user_id,
+            'message': 'Player disconnected'
+        }, room=room_id)
+
+@socketio.on('find_match')
+def handle_find_match(data):
+    user_id = socket_user_id()
+    if user_id is None:
+        emit('match_error', {'error': 'Not logged in'})
+        return
+    
+    join_room(user_room(user_id))
+    room_id, rating, error = find_match(user_id)
+    if error:
+        emit('match_error', {'error': error})
+    elif room_id is None:
+        matchmaking_sids[request.sid] = user_id
+        emit('match_queued', {'rating': rating, 'queue_size': len(matchmaking)})
+
+@socketio.on('cancel_match')
+def handle_cancel_match(data):
+    user_id = socket_user_id()
+    if user_id is None:
+        emit('match_error', {'error': 'Not logged in'})
+        return
+    matchmaking_sids.pop(request.sid, None)
+    if matchmaking.dequeue(user_id):
+        emit('match_cancelled', {'reason': 'cancelled'})
+
+@socketio.on('spectate_duel')
+def handle_spectate_duel(data):
+    room_id = data['room_id']
+    
+    previous = spectator_feed.sids.get(request.sid)
+    if previous is not None and previous != room_id:
+        leave_room(spectator_room(previous))
+    
+    state = spectator_feed.watch(request.sid, room_id)
+    if state is None:
+        emit('spectate_error', {'error': 'Duel not found'})
+        return
+    
+    # Full state once; the shared per-tick deltas follow
+    join_room(spectator_room(room_id))
+    version, snapshot = state
+    emit('spectator_snapshot', {'version': version, 'state': snapshot})
+
+@socketio.on('stop_spectating')
+def handle_stop_spectating(data):
+    room_id = spectator_feed.unwatch(request.sid)
+    if room_id is not None:
+        leave_room(spectator_room(room_id))
+
+@socketio.on('latency_pong')
+def handle_latency_pong(data):
+    binding = duel_connections.sids.get(request.sid)
+    latency_tracker.pong(request.sid, data.get('seq'), binding[1] if binding else None)
 
 @socketio.on('join_duel_room')
 def handle_join_duel_room(data):
     room_id = data['room_id']
-    user_id = data['user_id']
+    user_id = socket_user_id()
+    if user_id is None:
+        emit('duel_error', {'error': 'Not logged in'})
+        return
+    
+    # Only players who joined the duel over the REST API get its room
+    duel_data = duel_manager.get_duel(room_id)
+    if duel_data is None or user_id not in duel_data['scores']:
+        emit('duel_error', {'error': 'Duel not found'})
+        return
     
     join_room(room_id)
+    join_room(wire_room(room_id, duel_wire.format_of(request.sid)))
+    duel_connections.bind(request.sid, user_id, room_id)
+    duel_manager.set_connected(room_id, user_id, True)
+    latency_tracker.track_room(room_id)
+    ensure_latency_pinger()
     print(f'User {user_id} joined duel room {room_id}')
     
     # Notify other players in the room
     emit('player_joined', {
         'user_id': user_id,
+        'players': len(duel_data['scores']),
+        'max_players': duel_data['max_players'],
+        'status': duel_data['status'],
         'message': 'Player joined the duel'
     }, room=room_id, include_self=False)
 
 @socketio.on('start_duel')
 def handle_start_duel(data):
     room_id = data['room_id']
+    user_id = socket_user_id()
+    if user_id is None:
+        emit('duel_error', {'error': 'Not logged in'})
+        return
     
-    # Start the first round
-    round_data = duel_manager.start_round(room_id)
-    if round_data:
-        emit('round_started', round_data, room=room_id)
-        print(f'Round started in duel {room_id}: {round_data["question"]}')
+    # Full rooms start on their own; the host may start a room with at least two players
+    if not duel_manager.activate(room_id, user_id):
+        return
+    
+    # Start the first round; a no-op if this or another worker already started it
+    if not round_scheduler.pending(room_id):
+        begin_round(room_id, send_questions=True)
 
 @socketio.on('submit_answer')
 def handle_submit_answer(data):
     room_id = data['room_id']
-    user_id = data['user_id']
+    user_id = socket_user_id()
+    if user_id is None:
+        emit('duel_error', {'error': 'Not logged in'})
+        return
     answer = data['answer']
-    response_time = data['response_time']
     
-    # Process the answer
-    result = duel_manager.submit_answer(room_id, user_id, answer, response_time)
+    # Timed on the server; the client's own response_time is not trusted
+    result = duel_manager.submit_answer(room_id, user_id, answer, latency_tracker.network_delay(request.sid))
     
     if result:
         # Send result to the submitting player
-        emit('answer_result', result)
+        duel_wire.emit('answer_result', result, to=request.sid)
         
-        # Notify other players about the answer submission
-        emit('opponent_answered', {
-            'user_id': user_id,
-            'correct': result['correct'],
-            'points': result['points']
-        }, room=room_id, include_self=False)
-        
-        # Check if both players have answered
-        duel_data = duel_manager.active_duels.get(room_id)
-        if duel_data and duel_data['status'] == 'active':
-            # End round after a short delay to show results
-            import time
-            time.sleep(2)
-            round_result = duel_manager.end_round(room_id)
-            if round_result:
-                if round_result.get('status') == 'completed':
-                    emit('duel_ended', round_result, room=room_id)
-                else:
-                    # Start next round
-                    next_round = duel_manager.start_round(room_id)
-                    if next_round:
-                        emit('round_started', next_round, room=room_id)
+        # Other players see the change in the next coalesced standings update
+        standings_broadcaster.mark(room_id)
+        
+        # Once every player has answered, end the round after a short delay to show results
+        duel_data = duel_manager.get_duel(room_id)
+        if duel_manager.all_answered(room_id):
+            round_scheduler.schedule(
+                room_id,
+                app.config['DUEL_RESULT_DELAY'],
+                functools.partial(advance_duel, round_number=duel_data['round_number'])
+            )
 
 @socketio.on('leave_duel')
 def handle_leave_duel(data):
     room_id = data['room_id']
-    user_id = data['user_id']
+    user_id = socket_user_id()
+    if user_id is None:
+        emit('duel_error', {'error': 'Not logged in'})
+        return
     
     leave_room(room_id)
+    leave_room(wire_room(room_id, duel_wire.format_of(request.sid)))
+    duel_connections.unbind(request.sid)
     emit('player_left', {
         'user_id': user_id,
         'message': 'Player left the duel'
     }, room=room_id)
+    
+    # Leaving on purpose forfeits immediately
+    result = duel_manager.forfeit(room_id, user_id)
+    if result:
+        close_duel_room(room_id, result)
+    else:
+        standings_broadcaster.mark(room_id)
 
 @app.errorhandler(403)
 def forbidden(error):
     return redirect(url_for('menu'))
 
 @app.route('/dynamic')
+@static_page('dynamic.html')
 def dynamic():
     return render_template('dynamic.html')
 
 @app.route('/training-config')
+@static_page('training_config.html')
 def training_config():
     return render_template('training_config.html')
 
 @app.route('/training')
+@static_page('training.html')
 def training():
     return render_template('training.html')
 
 @app.route('/marathon')
+@static_page('marathon.html')
 def marathon():
     return render_template('marathon.html')
 
@@ -612,9 +1575,20 @@ def analytics():
         for a in analytics_data
     ]
     
+    current_session = trainer.sessions.get(user.id)
+    
     return render_template('analytics.html', 
                          progress=progress_data,
-                         analytics=analytics_dicts)
+                         analytics=analytics_dicts,
+                         session_stats=current_session.to_dict() if current_session else None)
+
+@app.route('/api/session-stats')
+def get_session_stats():
+    if 'user_id' not in session:
+        return jsonify({'error': 'User not logged in'}), 401
+    
+    current_session = trainer.sessions.get(session['user_id'])
+    return jsonify({'session': current_session.to_dict() if current_session else None})
 
 @app.route('/learning-path')
 def learning_path():
@@ -640,41 +1614,121 @@ def learning_path():
 @app.route('/get_question', methods=['GET'])
 def get_question():
     mode = request.args.get('mode', 'dynamic')
+    count = request.args.get('count', type=int)
+    seed = request.args.get('seed', type=int)
+    index = max(0, request.args.get('index', 0, type=int))
+    batch_size = max(1, min(count or 1, app.config['MAX_QUESTION_BATCH']))
     
     if mode == 'training':
         # Get training configuration from request parameters
         operations = request.args.get('operations', '').split(',') if request.args.get('operations') else None
-        min_range = int(request.args.get('min_range', 1))
-        max_range = int(request.args.get('max_range', 100))
         
         # Filter out empty strings and convert to list
         if operations:
             operations = [op for op in operations if op]
         
-        question, answer = trainer.generator.generate_question(
-            mode, 
-            operations=operations, 
-            min_range=min_range, 
-            max_range=max_range
-        )
+        try:
+            space = QuestionSpace(
+                operations,
+                request.args.get('min_range', 1, type=int),
+                request.args.get('max_range', 100, type=int)
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid range'}), 400
+        
+        if seed is None:
+            questions = [question_payload(*space.question(random.randrange(len(space)))) for _ in range(batch_size)]
+        else:
+            # Walk a seeded permutation of the range: no repeats until the space is exhausted
+            questions = [
+                dict(question_payload(*space.sample(seed, i)), seed=seed, index=i)
+                for i in range(index, index + batch_size)
+            ]
+    elif seed is not None:
+        # Seeded mode: question `index` of stream `seed` is reproducible on any worker
+        stream = QuestionStream(seed)
+        questions = [
+            dict(question_payload(*question), seed=seed, index=i)
+            for i, question in enumerate(stream.take(index, batch_size), index)
+        ]
     else:
-        question, answer = trainer.generator.generate_question(mode)
+        questions = [question_payload(*trainer.generator.draw()) for _ in range(batch_size)]
     
-    return jsonify({'question': question, 'answer': answer})
+    # Batch mode: clients keep a local queue and refill it ahead of time
+    if count is None:
+        return jsonify(questions[0])
+    return jsonify({'questions': questions})
 
 @app.route('/check_answer', methods=['POST'])
 def check_answer():
     data = request.json
-    user_answer = int(data['user_answer'])
-    correct_answer = int(data['correct_answer'])
-    operation = data.get('operation', '+')
-    response_time = float(data.get('response_time', 0))
+    try:
+        user_answer = int(data['user_answer'])
+        response_time = parse_response_time(data.get('response_time', 0))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify({'error': 'Invalid data'}), 400
+    
+    # The correct answer comes from the signed token, never from the client
+    try:
+        correct_answer, operation = verify_attempt(data.get('token'))
+    except InvalidQuestionToken as e:
+        return jsonify({'error': str(e)}), 400
 
-    is_correct = trainer.check_answer(user_answer, correct_answer, operation, response_time)
+    is_correct, stats = trainer.check_answer(user_answer, correct_answer, operation, response_time)
 
     return jsonify({
         'is_correct': is_correct,
-        'correct_answers': trainer.correct_answers,
+        # Correct answers in this user's current session; None when not logged in
+        'correct_answers': stats.correct if stats is not None else None,
+    })
+
+@app.route('/api/attempts/batch', methods=['POST'])
+def check_answers_batch():
+    data = request.json or {}
+    raw_attempts = data.get('attempts')
+    
+    if not isinstance(raw_attempts, list):
+        return jsonify({'error': 'Invalid data'}), 400
+    
+    if len(raw_attempts) > app.config['MAX_ATTEMPT_BATCH']:
+        return jsonify({'error': 'Too many attempts in one batch'}), 400
+    
+    # Each attempt is verified on its own; bad or expired ones are reported
+    # by index without failing the rest of the batch. A question counts once
+    # per batch, so repeating one token can't inflate Progress and Analytics
+    attempts, accepted, rejected = [], [], []
+    tokens = set()
+    for index, attempt in enumerate(raw_attempts):
+        try:
+            attempt_data = (
+                int(attempt['user_answer']), *verify_attempt(attempt.get('token')),
+                parse_response_time(attempt.get('response_time', 0))
+            )
+            token = str(attempt['token'])
+            if token in tokens:
+                rejected.append({'index': index, 'error': 'Duplicate question token'})
+                continue
+            tokens.add(token)
+            attempts.append(attempt_data)
+            accepted.append(index)
+        except InvalidQuestionToken as e:
+            rejected.append({'index': index, 'error': str(e)})
+        except (KeyError, TypeError, ValueError, AttributeError):
+            rejected.append({'index': index, 'error': 'Invalid data'})
+    
+    if rejected and not attempts:
+        return jsonify({'error': 'No valid attempts', 'rejected': rejected}), 400
+    
+    # results[i] is attempt i's outcome, None where it was rejected
+    results = [None] * len(raw_attempts)
+    for index, correct in zip(accepted, trainer.check_answers(attempts)):
+        results[index] = correct
+    
+    return jsonify({
+        'results': results,
+        'accepted': len(attempts),
+        'correct_answers': sum(1 for correct in results if correct),
+        'rejected': rejected
     })
 
 @app.route('/register', methods=['POST'])
@@ -756,60 +1810,133 @@ def update_username():
     if user:
         user.username = new_username
         db.session.commit()
+        for index in leaderboard_indexes.values():
+            index.rename(user.id, new_username)
+        bump_leaderboard_version()
         return jsonify({'success': True, 'username': new_username})
     else:
         return jsonify({'error': 'User not found'}), 404
 
 @app.route('/leaderboard')
+@static_page('leaderboard.html')
 def leaderboard():
     return render_template('leaderboard.html')
 
 @app.route('/api/leaderboard/<mode>')
+@conditional('private, no-cache', leaderboard_etag)
 def get_leaderboard(mode):
-    if mode not in ['standard', 'marathon']:
+    if mode not in LEADERBOARD_MODES:
         return jsonify({'error': 'Invalid mode'}), 400
     
     try:
-        # Get top scores for the mode with pagination support
-        page = request.args.get('page', 1, type=int)
+        # Pages are either numbered (?page=N) or follow an opaque cursor (?after=...)
+        # taken from the previous page's next_cursor; cursor pages never skip rows
         per_page = request.args.get('per_page', 50, type=int)
+        after = request.args.get('after')
         
         # Limit per_page to prevent abuse
-        per_page = min(per_page, 100)
-        
-        scores = LeaderboardScore.query.filter_by(mode=mode)\
-            .order_by(LeaderboardScore.score.desc(), LeaderboardScore.created_at.asc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
-        
-        entries = []
-        for i, score in enumerate(scores.items, (page - 1) * per_page + 1):
-            entries.append({
-                'rank': i,
-                'user_id': score.user_id,
-                'username': score.user.username,
-                'score': score.score,
-                'created_at': score.created_at.isoformat() if score.created_at else None
+        per_page = min(max(per_page, 1), 100)
+        
+        # 'all' (best ever), or the best scores of the current UTC day or week
+        window = request.args.get('window', 'all')
+        if window not in LEADERBOARD_WINDOWS:
+            return jsonify({'error': 'Invalid window'}), 400
+        
+        use_index = ensure_leaderboard_index(window)
+        index = leaderboard_indexes[window]
+        if after:
+            try:
+                rank, key = decode_cursor(after)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            if use_index:
+                entries = index.page_after(mode, key, per_page + 1)
+            else:
+                entries = leaderboard_page(mode, per_page + 1, first_rank=rank + 1, after=key, window=window)
+        else:
+            page = max(request.args.get('page', 1, type=int), 1)
+            offset = (page - 1) * per_page
+            if use_index:
+                entries = index.page(mode, offset, per_page + 1)
+            else:
+                entries = leaderboard_page(mode, per_page + 1, first_rank=offset + 1, offset=offset, window=window)
+        
+        # One extra entry was fetched to tell whether another page follows
+        has_next = len(entries) > per_page
+        entries = entries[:per_page]
+        pagination = {
+            'per_page': per_page,
+            'has_next': has_next,
+            'next_cursor': encode_cursor(entries[-1]) if has_next else None
+        }
+        if not after:
+            total = leaderboard_total(mode, window)
+            pagination.update({
+                'page': page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page,
+                'has_prev': page > 1
             })
+        elif request.args.get('total', type=int):
+            pagination['total'] = leaderboard_total(mode, window)
         
         # Get current user ID if logged in
         current_user_id = session.get('user_id') if 'user_id' in session else None
+        start = leaderboard_periods.get(window) if window != 'all' else None
         
         return jsonify({
+            'window': window,
+            'period_start': start.isoformat() if start else None,
             'entries': entries,
             'current_user_id': current_user_id,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': scores.total,
-                'pages': scores.pages,
-                'has_next': scores.has_next,
-                'has_prev': scores.has_prev
-            }
+            'pagination': pagination
         })
     except Exception as e:
+        db.session.rollback()
         print(f"Leaderboard error: {e}")
         return jsonify({'error': 'Failed to load leaderboard'}), 500
 
+@app.route('/api/leaderboard/<mode>/me')
+@conditional('private, no-cache', leaderboard_etag)
+def get_my_rank(mode):
+    if mode not in LEADERBOARD_MODES:
+        return jsonify({'error': 'Invalid mode'}), 400
+    if 'user_id' not in session:
+        return jsonify({'error': 'User not logged in'}), 401
+    
+    try:
+        # Entries shown either side of the player
+        around = min(max(request.args.get('around', 5, type=int), 0), 25)
+        user_id = session['user_id']
+        window = request.args.get('window', 'all')
+        if window not in LEADERBOARD_WINDOWS:
+            return jsonify({'error': 'Invalid window'}), 400
+        
+        if ensure_leaderboard_index(window):
+            rank, entries = leaderboard_indexes[window].around(mode, user_id, around)
+        else:
+            rank, entries = leaderboard_around(mode, user_id, around, window)
+        # A cached database count can lag behind the rank
+        total = max(leaderboard_total(mode, window), rank or 0)
+        score = next((entry['score'] for entry in entries if entry['user_id'] == user_id), None)
+        start = leaderboard_periods.get(window) if window != 'all' else None
+        
+        return jsonify({
+            'window': window,
+            'period_start': start.isoformat() if start else None,
+            'rank': rank,
+            'score': score,
+            'total': total,
+            # Share of players ranked at or below this one
+            'percentile': round((total - rank + 1) / total * 100, 1) if rank else None,
+            'entries': entries,
+            'current_user_id': user_id
+        })
+    except Exception as e:
+        db.session.rollback()
+        print(f"Leaderboard rank error: {e}")
+        return jsonify({'error': 'Failed to load rank'}), 500
+
 @app.route('/api/submit-score', methods=['POST'])
 def submit_score():
     if 'user_id' not in session:
@@ -820,49 +1947,68 @@ def submit_score():
         mode = data.get('mode')
         score = data.get('score')
         
-        if mode not in ['standard', 'marathon'] or not isinstance(score, int):
+        if mode not in LEADERBOARD_MODES or not isinstance(score, int):
             return jsonify({'error': 'Invalid data'}), 400
         
         # Validate score range (prevent abuse)
         if score < 0 or score > 10000:  # Reasonable upper limit
             return jsonify({'error': 'Invalid score value'}), 400
         
-        # Check if user already has a score for this mode
-        existing_score = LeaderboardScore.query.filter_by(
-            user_id=session['user_id'], 
-            mode=mode
-        ).first()
-        
-        if existing_score:
-            # Update existing score if new score is higher
-            if score > existing_score.score:
-                existing_score.score = score
-                existing_score.created_at = datetime.utcnow()  # Update timestamp
-                db.session.commit()
-                return jsonify({
-                    'message': 'Score updated successfully',
-                    'previous_score': existing_score.score,
-                    'new_score': score
-                })
-            else:
-                return jsonify({
-                    'message': 'Score not updated (lower than existing)',
-                    'current_score': existing_score.score,
-                    'attempted_score': score
-                })
-        else:
-            # Create new score
-            leaderboard_score = LeaderboardScore(
+        # Daily and weekly buckets for the current periods (starting new ones at rollover)
+        periods = {window: roll_leaderboard_window(window) for window in ('daily', 'weekly')}
+        
+        # Insert, or keep the higher of the stored and submitted score, in one statement
+        created_at = datetime.utcnow()
+        stmt = upsert(LeaderboardScore).values(
+            user_id=session['user_id'],
+            mode=mode,
+            score=score,
+            created_at=created_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'mode'],
+            set_={'score': stmt.excluded.score, 'created_at': stmt.excluded.created_at},
+            where=LeaderboardScore.score < stmt.excluded.score
+        ).returning(LeaderboardScore.score)
+        
+        stored = db.session.execute(stmt).first()
+        
+        # Each bucket keeps its own best, even when the all-time best stands
+        improved = {'all': stored is not None}
+        for window, start in periods.items():
+            bucket = upsert(LeaderboardPeriodScore).values(
                 user_id=session['user_id'],
                 mode=mode,
-                score=score
+                period=window,
+                period_start=start,
+                score=score,
+                created_at=created_at
             )
-            db.session.add(leaderboard_score)
-            db.session.commit()
+            bucket = bucket.on_conflict_do_update(
+                index_elements=['user_id', 'mode', 'period', 'period_start'],
+                set_={'score': bucket.excluded.score, 'created_at': bucket.excluded.created_at},
+                where=LeaderboardPeriodScore.score < bucket.excluded.score
+            ).returning(LeaderboardPeriodScore.score)
+            improved[window] = db.session.execute(bucket).first() is not None
+        db.session.commit()
+        
+        user_id = session['user_id']
+        if any(improved.values()):
+            bump_leaderboard_version()
+        for window, index in leaderboard_indexes.items():
+            if improved[window] and index.loaded:
+                username = index.usernames.get(user_id) or User.query.get(user_id).username
+                index.update(mode, user_id, score, created_at, username)
+        
+        if stored is None:
             return jsonify({
-                'message': 'Score submitted successfully',
-                'score': score
+                'message': 'Score not updated (lower than existing)',
+                'attempted_score': score
             })
+        return jsonify({
+            'message': 'Score submitted successfully',
+            'score': score
+        })
     except Exception as e:
         db.session.rollback()
         print(f"Score submission error: {e}")
@@ -946,18 +2092,48 @@ def callback():
         traceback.print_exc()
         return redirect(url_for("menu"))
 
+def require_current_schema():
+    """Refuse to start on a database that db.create_all() can't bring up to date
+
+    Missing columns or non-unique upsert indexes would otherwise fail every
+    duel creation, score submission and write-behind flush.
+    """
+    if os.environ.get('SKIP_SCHEMA_CHECK'):
+        return
+    problems = schema_problems()
+    if problems:
+        raise RuntimeError(
+            "Database schema is out of date, run 'python migrate_db.py upgrade': " + '; '.join(problems)
+        )
+
 # Create database tables (only if not in production/vercel)
 import os
 if not os.environ.get('VERCEL') and not os.environ.get('RENDER'):
     with app.app_context():
         db.create_all()
+        require_current_schema()
+        try:
+            if duel_manager.recover():
+                ensure_duel_sweeper()
+        except Exception as e:
+            print(f"Duel recovery error: {e}")
+        try:
+            ensure_leaderboard_index()
+        except Exception as e:
+            print(f"Leaderboard index error: {e}")
 
 # Initialize database for Render deployment
 if os.environ.get('RENDER'):
     with app.app_context():
+        db.create_all()
+        require_current_schema()
+        print("Database tables created successfully on Render")
         try:
-            db.create_all()
-            print("Database tables created successfully on Render")
+            recovered = duel_manager.recover()
+            print(f"Recovered {recovered} active duels")
+            if recovered:
+                ensure_duel_sweeper()
+            ensure_leaderboard_index()
         except Exception as e:
             print(f"Database initialization error on Render: {e}")
 
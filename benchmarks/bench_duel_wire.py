@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Duel wire format benchmark for Math Trainer Game
+Replays the duel events one player receives over a whole duel and reports
+the Socket.IO bytes on the wire and the messages encoded per second for JSON
+events, per-tick JSON batches and binary frames.
+
+Usage:
+  python benchmarks/bench_duel_wire.py [rounds]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio import packet
+
+from duel_wire import encode_frame
+
+
+def duel_events(players, rounds, seed=1):
+    """Per-tick batches of (event, payload) one player receives during a duel."""
+    rng = random.Random(seed)
+    scores = {user_id: 0 for user_id in range(1, players + 1)}
+    ticks = []
+    for round_number in range(1, rounds + 1):
+        ticks.append([('round_started', {
+            'question': f'{rng.randint(2, 100)} + {rng.randint(2, 100)}',
+            'round': round_number,
+            'time_limit': 30
+        })])
+        for user_id in scores:
+            points = rng.choice([0, 25, 50, 75, 100])
+            scores[user_id] += points
+            if user_id == 1:
+                ticks.append([('answer_result', {
+                    'correct': points > 0, 'points': points, 'total_score': scores[user_id],
+                    'response_time': round(rng.uniform(1, 15), 3), 'network_delay': 0.042
+                })])
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        ticks.append([('standings', {
+            'round': round_number, 'answered': players, 'players': players,
+            'standings': [
+                {'user_id': user_id, 'score': score, 'rank': rank, 'forfeited': False}
+                for rank, (user_id, score) in enumerate(ranked, 1)
+            ]
+        })])
+    # The last standings and the result share a tick
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    ticks[-1].append(('duel_ended', {
+        'status': 'completed', 'winner': ranked[0][0], 'final_scores': dict(scores),
+        'standings': [user_id for user_id, _ in ranked], 'total_rounds': rounds
+    }))
+    return ticks
+
+
+def wire_size(encoded):
+    """Bytes of an encoded Socket.IO packet, including binary attachments."""
+    if isinstance(encoded, list):
+        return sum(len(part) if isinstance(part, bytes) else len(part.encode()) for part in encoded)
+    return len(encoded.encode())
+
+
+def packets(ticks, wire_format):
+    for messages in ticks:
+        if wire_format == 'json':
+            for event, payload in messages:
+                yield [event, payload]
+        elif wire_format == 'json batch':
+            yield [messages[0][0], messages[0][1]] if len(messages) == 1 else ['duel_batch', [list(m) for m in messages]]
+        else:
+            yield ['duel_frame', encode_frame(messages)]
+
+
+def measure(ticks, wire_format, repeat=200):
+    sent = list(packets(ticks, wire_format))
+    size = sum(wire_size(packet.Packet(packet.EVENT, data=data).encode()) for data in sent)
+
+    messages = sum(len(messages) for messages in ticks)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data in packets(ticks, wire_format):
+            packet.Packet(packet.EVENT, data=data).encode()
+    rate = messages * repeat / (time.perf_counter() - start)
+    return size, len(sent), rate
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    for players in (2, 10, 100):
+        ticks = duel_events(players, rounds)
+        print(f"{players} players, {rounds} rounds, {sum(len(m) for m in ticks)} events per player")
+        baseline = None
+        for wire_format in ('json', 'json batch', 'binary'):
+            size, emits, rate = measure(ticks, wire_format, repeat=max(10, 2000 // players))
+            baseline = baseline or size
+            print(f"  {wire_format:10s}  {size:9,d} bytes/duel ({size / baseline:5.1%})  "
+                  f"{emits:4d} emits  {rate:12,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
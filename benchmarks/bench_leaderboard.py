@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Leaderboard benchmark for Math Trainer Game
+Fills an in-memory SQLite database (TestingConfig) with one best score per
+user, then compares the old page query (ORDER BY ... OFFSET plus COUNT(*))
+with keyset (``after=`` cursor) pages from the database and with the
+in-memory rank index: load time, memory, score updates, rank lookups and
+pages at increasing depth.
+
+Usage:
+  python benchmarks/bench_leaderboard.py [entries]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FLASK_CONFIG'] = 'testing'
+
+from sqlalchemy import insert
+
+from app import app, leaderboard_rows, leaderboard_page
+from leaderboard_index import LeaderboardIndex, encode_cursor, decode_cursor
+from models import db, User, LeaderboardScore
+
+
+def populate(entries, seed=1):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    for first in range(1, entries + 1, 50000):
+        ids = range(first, min(entries, first + 49999) + 1)
+        db.session.execute(insert(User), [{'id': i, 'username': f'player{i}'} for i in ids])
+        db.session.execute(insert(LeaderboardScore), [{
+            'user_id': i, 'mode': 'standard',
+            'score': min(10000, max(0, round(rng.gauss(3000, 1200)))),
+            'created_at': start + timedelta(seconds=rng.randrange(365 * 86400))
+        } for i in ids])
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def query_page(offset, per_page):
+    """The page read /api/leaderboard did before the index: OFFSET scan, COUNT(*) and lazy usernames"""
+    query = LeaderboardScore.query.filter_by(mode='standard')\
+        .order_by(LeaderboardScore.score.desc(), LeaderboardScore.created_at.asc())
+    query.count()
+    return [score.user.username for score in query.offset(offset).limit(per_page)]
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(2)
+
+    with app.app_context():
+        start = time.perf_counter()
+        populate(entries)
+        print(f"{entries:,} scores inserted in {time.perf_counter() - start:.1f}s\n")
+
+        index = LeaderboardIndex(('standard', 'marathon'))
+        start = time.perf_counter()
+        index.load(leaderboard_rows())
+        print(f"index load       {time.perf_counter() - start:8.2f} s")
+
+        rows = leaderboard_rows().all()
+        tracemalloc.start()
+        LeaderboardIndex(('standard', 'marathon')).load(rows)
+        print(f"index memory     {tracemalloc.get_traced_memory()[1] / 1024 / 1024:8.1f} MiB")
+        tracemalloc.stop()
+        del rows
+
+        updates = [(rng.randint(1, entries), rng.randint(0, 10000)) for _ in range(20000)]
+        now = datetime.utcnow()
+        start = time.perf_counter()
+        for user_id, score in updates:
+            index.update('standard', user_id, score, now)
+        print(f"index update     {(time.perf_counter() - start) / len(updates) * 1e6:8.2f} us")
+
+        users = [rng.randint(1, entries) for _ in range(20000)]
+        start = time.perf_counter()
+        for user_id in users:
+            index.rank('standard', user_id)
+        print(f"index rank       {(time.perf_counter() - start) / len(users) * 1e6:8.2f} us")
+        print(f"index total      {timed(lambda: index.total('standard'), 10000) * 1e6:8.2f} us\n")
+
+        per_page = 50
+        baseline = LeaderboardIndex(('standard',))
+        baseline.load(leaderboard_rows())
+        print(f"{'page':>8s}  {'OFFSET + COUNT':>16s}  {'keyset (db)':>12s}  {'index':>10s}")
+        for page in (1, 10, 100, 1000, 10000):
+            offset = (page - 1) * per_page
+            if offset >= entries:
+                break
+            sql = timed(lambda: query_page(offset, per_page), 3)
+            if offset:
+                rank, key = decode_cursor(encode_cursor(baseline.page('standard', offset - 1, 1)[0]))
+                keyset = timed(lambda: leaderboard_page('standard', per_page + 1, rank + 1, after=key), 20)
+            else:
+                keyset = timed(lambda: leaderboard_page('standard', per_page + 1, 1), 20)
+            memory_page = timed(lambda: index.page('standard', offset, per_page), 1000)
+            print(f"{page:8,d}  {sql * 1000:13.2f} ms  {keyset * 1000:9.2f} ms  {memory_page * 1000:7.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Matchmaking load test for Math Trainer Game
+Simulates players arriving at the duel queue and reports how long they wait
+for an opponent (simulated seconds) and how long queue operations take (wall
+clock), then measures queue operations with tens of thousands of players
+waiting at once.
+
+Usage:
+  python benchmarks/bench_matchmaking.py [players] [arrivals_per_second]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matchmaking import MatchmakingQueue
+
+
+def percentiles(values, points=(50, 95, 99)):
+    values = sorted(values)
+    if not values:
+        return {p: 0.0 for p in points}
+    return {p: values[min(len(values) - 1, int(len(values) * p / 100))] for p in points}
+
+
+def fmt(values, unit, scale=1.0):
+    result = percentiles(values)
+    return '  '.join(f"p{p}: {result[p] * scale:9.3f} {unit}" for p in result)
+
+
+def random_rating(rng):
+    return min(2000, max(0, round(rng.gauss(1000, 300))))
+
+
+def simulate_arrivals(players, rate, tick=1.0, seed=1):
+    """Players arrive as a Poisson process; the matcher runs every `tick` seconds."""
+    rng = random.Random(seed)
+    queue = MatchmakingQueue()
+    waits, enqueue_times, match_times = [], [], []
+    peak = 0
+
+    now = 0.0
+    next_tick = tick
+    for user_id in range(players):
+        now += rng.expovariate(rate)
+        while next_tick <= now:
+            start = time.perf_counter()
+            pairs = queue.match(next_tick)
+            match_times.append(time.perf_counter() - start)
+            for a, b in pairs:
+                waits.extend([next_tick - a.enqueued_at, next_tick - b.enqueued_at])
+            next_tick += tick
+
+        start = time.perf_counter()
+        opponent = queue.enqueue(user_id, random_rating(rng), now)
+        enqueue_times.append(time.perf_counter() - start)
+        if opponent is not None:
+            waits.extend([now - opponent.enqueued_at, 0.0])
+        peak = max(peak, len(queue))
+
+    print(f"Arrivals: {players:,} players at {rate:,.0f}/s  "
+          f"matched: {len(waits):,}  still queued: {len(queue):,}  peak queue: {peak:,}")
+    print(f"  wait for opponent   {fmt(waits, 's')}")
+    print(f"  enqueue             {fmt(enqueue_times, 'us', 1e6)}")
+    print(f"  match pass          {fmt(match_times, 'ms', 1e3)}")
+
+
+def saturated_queue(players, seed=2):
+    """Hold `players` in the queue at once, then time operations at that size."""
+    rng = random.Random(seed)
+    # No spread at enqueue time, so nobody pairs until the ranges widen
+    queue = MatchmakingQueue(base_spread=0, spread_per_second=0.001)
+
+    start = time.perf_counter()
+    for user_id in range(players):
+        queue.enqueue(user_id, rng.uniform(0, 2000), 0.0)
+    fill = time.perf_counter() - start
+
+    enqueue_times, dequeue_times = [], []
+    for user_id in range(players, players + 10000):
+        start = time.perf_counter()
+        queue.enqueue(user_id, rng.uniform(0, 2000), 0.0)
+        enqueue_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        queue.dequeue(user_id)
+        dequeue_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pairs = queue.match(60.0)
+    match_time = time.perf_counter() - start
+
+    print(f"Saturated: {players:,} queued in {fill:.2f}s  "
+          f"match pass paired {len(pairs) * 2:,} in {match_time * 1e3:.1f} ms")
+    print(f"  enqueue             {fmt(enqueue_times, 'us', 1e6)}")
+    print(f"  dequeue             {fmt(dequeue_times, 'us', 1e6)}")
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    simulate_arrivals(players, rate)
+    simulate_arrivals(players, rate / 100)
+    saturated_queue(players)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Question generation benchmark for Math Trainer Game
+Compares questions/sec of the legacy eval()-based QuestionGenerator (kept
+here as the baseline; the app no longer uses it) against the NumPy-backed
+PooledQuestionGenerator.
+
+Usage:
+  python benchmarks/bench_question_pool.py [count]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_pool import PooledQuestionGenerator
+
+
+class QuestionGenerator:
+    """The app's original generator: rejection-sampled operands answered with eval()"""
+
+    def __init__(self):
+        self.used_questions = set()
+
+    def generate_question(self, operations=None):
+        if operations is None:
+            operations = ['+', '-', '*', '/']
+        
+        while True:
+            operation = random.choice(operations)
+
+            if operation == '+':
+                a, b = random.randint(2, 100), random.randint(2, 100)
+            elif operation == '-':
+                a = random.randint(2, 100)
+                b = random.randint(2, a)
+            elif operation == '*':
+                a = random.randint(2, 12)
+                b = random.randint(2, 100)
+            else:
+                b = random.randint(2, 12)
+                a = b * random.randint(2, 100)
+
+            question_str = f'{a} {operation} {b}'
+            if question_str not in self.used_questions:
+                self.used_questions.add(question_str)
+                return question_str, eval(question_str)
+
+            if len(self.used_questions) > 100:
+                self.used_questions.clear()
+
+
+def run(draw, count, operations=None):
+    start = time.perf_counter()
+    for _ in range(count):
+        draw(operations)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    pooled = PooledQuestionGenerator()
+    run(pooled.draw, 10000)  # warm the pools
+
+    for label, operations in [('mixed', None), ('+ only', ['+']), ('/ only', ['/'])]:
+        legacy_rate = run(QuestionGenerator().generate_question, count, operations)
+        pooled_rate = run(pooled.draw, count, operations)
+        print(f"{label:8s}  legacy: {legacy_rate:12,.0f} q/s   "
+              f"pooled: {pooled_rate:12,.0f} q/s   speedup: {pooled_rate / legacy_rate:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Shared-store duel check for Math Trainer Game
+Plays full duels through two DuelManagers that share one RedisDuelStore, as
+two workers behind a load balancer would: every round is started by both
+(only one start may win), answers arrive through either manager and are
+repeated through the other, and both fire the round timer. The check fails
+if a round starts twice, an answer is scored twice, or the final scores
+differ from the points handed out.
+
+Runs against fakeredis unless --redis-url names a real server.
+
+Usage:
+  python benchmarks/check_redis_duel.py [--duels 20] [--rounds 5] [--players 2]
+                                        [--redis-url redis://localhost:6379/0]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FLASK_CONFIG'] = 'testing'
+
+from app import app, DuelManager
+from duel_store import RedisDuelStore
+from models import db, User, DuelScore
+from question_tokens import compute_answer
+
+
+def shared_store(redis_url):
+    store = RedisDuelStore(redis_url or 'redis://localhost:6379/0', prefix=f'check{random.randrange(1 << 30)}')
+    if not redis_url:
+        try:
+            import fakeredis
+        except ImportError:
+            sys.exit('fakeredis is not installed; pip install fakeredis or pass --redis-url')
+        store.client = fakeredis.FakeRedis()
+    return store
+
+
+def play_duel(workers, user_ids, rounds, rng):
+    """Play one duel to the end; returns a list of problems found."""
+    problems = []
+    room_id = workers[0].create_duel(user_ids[0], max_rounds=rounds, max_players=len(user_ids))
+    for user_id in user_ids[1:]:
+        ok, message = rng.choice(workers).join_duel(room_id, user_id)
+        if not ok:
+            return [f'{room_id}: join failed: {message}']
+
+    awarded = {user_id: 0 for user_id in user_ids}
+    for round_number in range(1, rounds + 1):
+        # Both workers try to start the round; exactly one may succeed
+        started = [worker.start_round(room_id) for worker in rng.sample(workers, len(workers))]
+        winners = [round_data for round_data in started if round_data]
+        if len(winners) != 1 or winners[0]['round'] != round_number:
+            problems.append(f'{room_id}: round {round_number} started {len(winners)} times')
+            if not winners:
+                break
+
+        a, operation, b = winners[0]['question'].split(' ')
+        answer = compute_answer(int(a), operation, int(b))
+        for user_id in user_ids:
+            first, second = rng.sample(workers, 2)
+            result = first.submit_answer(room_id, user_id, answer if rng.random() < 0.8 else answer + 1)
+            if result is None:
+                problems.append(f'{room_id}: round {round_number} answer from {user_id} refused')
+                continue
+            awarded[user_id] += result['points']
+            if second.submit_answer(room_id, user_id, answer) is not None:
+                problems.append(f'{room_id}: round {round_number} answer from {user_id} scored twice')
+
+        # Both workers' timers fire for the round; only one may advance it
+        ended = [worker.end_round(room_id, expected_round=round_number) for worker in rng.sample(workers, 2)]
+        if sum(1 for round_result in ended if round_result) != 1:
+            problems.append(f'{room_id}: round {round_number} ended {sum(map(bool, ended))} times')
+        result = next((round_result for round_result in ended if round_result), None)
+
+    if result is None or result.get('status') != 'completed':
+        return problems + [f'{room_id}: duel did not complete']
+    if result['final_scores'] != awarded:
+        problems.append(f'{room_id}: final scores {result["final_scores"]} != awarded {awarded}')
+    stored = {duel_score.user_id: duel_score.score for duel_score in DuelScore.query.join(DuelScore.duel)
+              .filter_by(room_id=room_id)}
+    if stored != awarded:
+        problems.append(f'{room_id}: stored scores {stored} != awarded {awarded}')
+    if workers[0].get_duel(room_id) is not None:
+        problems.append(f'{room_id}: state left in the store')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared-store duel check')
+    parser.add_argument('--duels', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--redis-url', help='real Redis server to use instead of fakeredis')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    store = shared_store(args.redis_url)
+    workers = [DuelManager(store), DuelManager(store)]
+
+    with app.app_context():
+        users = [User(username=f'check_{index}') for index in range(args.players)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+
+        problems = []
+        for _ in range(args.duels):
+            problems += play_duel(workers, user_ids, args.rounds, rng)
+
+    print(f"{args.duels} duels x {args.rounds} rounds through 2 managers sharing "
+          f"{'Redis at ' + args.redis_url if args.redis_url else 'fakeredis'}: {len(problems)} problems")
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Duel load test for Math Trainer Game
+Plays full duels against an in-process instance (TestingConfig, in-memory
+SQLite) with headless Socket.IO test clients, all on one eventlet hub like a
+single production worker. Players register, create and join rooms through
+the REST API, and then play every round with start_duel/submit_answer.
+
+Each stage of the ramp runs that many duels at once and reports rounds/sec,
+event latency percentiles, memory growth, errors and any duel state left
+behind once every duel has finished.
+
+Usage:
+  python benchmarks/load_duels.py [--ramp 10,50,100] [--rounds 5] [--players 2]
+                                  [--think 0.05,0.3] [--wire json|binary]
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FLASK_CONFIG'] = 'testing'
+
+import eventlet
+
+from app import app, socketio, duel_manager, duel_connections, round_scheduler
+from duel_wire import decode_frame
+from question_tokens import compute_answer
+
+
+class LoadTestError(Exception):
+    pass
+
+
+class Player:
+    """One headless client: a Flask test client for REST plus a Socket.IO test client."""
+
+    def __init__(self, username, wire):
+        self.http = app.test_client()
+        response = self.http.post('/register', json={'username': username})
+        if response.status_code != 200:
+            raise LoadTestError(f'register {response.status_code}')
+        self.sio = socketio.test_client(app, flask_test_client=self.http, auth={'format': wire})
+        self.inbox = []
+
+    def poll(self):
+        for packet in self.sio.get_received():
+            name, args = packet['name'], packet['args']
+            if name == 'duel_frame':
+                self.inbox.extend(decode_frame(args[0]))
+            elif name == 'duel_batch':
+                self.inbox.extend((event, payload) for event, payload in args[0])
+            elif name == 'latency_ping':
+                self.sio.emit('latency_pong', args[0])
+            else:
+                self.inbox.append((name, args[0] if args else None))
+
+    def wait_for(self, names, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            self.poll()
+            for index, (name, payload) in enumerate(self.inbox):
+                if name in names:
+                    del self.inbox[index]
+                    return name, payload
+            if time.monotonic() > deadline:
+                raise LoadTestError(f'timeout waiting for {"/".join(names)}')
+            eventlet.sleep(0.005)
+
+    def close(self):
+        if self.sio.is_connected():
+            self.sio.disconnect()
+
+
+class Stage:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # {event: [seconds, ...]}
+        self.errors = defaultdict(int)      # {error: count}
+        self.rounds = 0
+        self.duels = 0
+
+    def timed(self, event, started):
+        self.latencies[event].append(time.monotonic() - started)
+
+
+def play(player, room_id, stage, args, is_host):
+    """Answer every round until the duel ends."""
+    rng = random.Random()
+    while True:
+        started = time.monotonic()
+        name, payload = player.wait_for(('round_started', 'duel_ended'), args.timeout)
+        stage.timed('round_wait', started)
+        if name == 'duel_ended':
+            return
+        if is_host:
+            stage.rounds += 1
+
+        eventlet.sleep(rng.uniform(*args.think))
+        a, operation, b = payload['question'].split(' ')
+        answer = compute_answer(int(a), operation, int(b))
+        if rng.random() > args.accuracy:
+            answer += 1
+
+        started = time.monotonic()
+        player.sio.emit('submit_answer', {'room_id': room_id, 'answer': answer})
+        player.wait_for(('answer_result',), args.timeout)
+        stage.timed('answer_result', started)
+
+
+def run_duel(index, stage, args):
+    players = []
+    try:
+        players = [Player(f'load_{args.stage}_{index}_{seat}', args.wire) for seat in range(args.players)]
+        host = players[0]
+
+        started = time.monotonic()
+        response = host.http.post('/api/duel/create', json={
+            'time_limit': args.time_limit, 'max_rounds': args.rounds, 'max_players': args.players
+        })
+        stage.timed('create', started)
+        if response.status_code != 200:
+            raise LoadTestError(f'create {response.status_code}')
+        room_id = response.get_json()['room_id']
+
+        for player in players[1:]:
+            started = time.monotonic()
+            response = player.http.post(f'/api/duel/join/{room_id}')
+            stage.timed('join', started)
+            if response.status_code != 200:
+                raise LoadTestError(f'join {response.status_code}')
+
+        for player in players:
+            player.sio.emit('join_duel_room', {'room_id': room_id})
+        host.sio.emit('start_duel', {'room_id': room_id})
+
+        threads = [eventlet.spawn(play, player, room_id, stage, args, player is host) for player in players]
+        for thread in threads:
+            thread.wait()
+        stage.duels += 1
+    except LoadTestError as e:
+        stage.errors[str(e)] += 1
+    except Exception as e:
+        stage.errors[f'{type(e).__name__}: {e}'] += 1
+    finally:
+        for player in players:
+            player.close()
+
+
+def percentiles(values):
+    values = sorted(values)
+    return [values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 for p in (50, 95, 99)]
+
+
+def run_stage(concurrency, args):
+    stage = Stage()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    started = time.monotonic()
+
+    pool = eventlet.GreenPool(concurrency)
+    for index in range(concurrency):
+        pool.spawn(run_duel, index, stage, args)
+    pool.waitall()
+
+    elapsed = time.monotonic() - started
+    eventlet.sleep(0.5)  # let background tasks drain
+    memory_after = tracemalloc.get_traced_memory()[0]
+
+    print(f"\n{concurrency} concurrent duels: {stage.duels} finished, {stage.rounds} rounds "
+          f"in {elapsed:.1f}s = {stage.rounds / elapsed:,.1f} rounds/s")
+    for event in ('create', 'join', 'answer_result', 'round_wait'):
+        if stage.latencies[event]:
+            p50, p95, p99 = percentiles(stage.latencies[event])
+            print(f"  {event:14s} p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  p99 {p99:8.1f} ms  "
+                  f"(n={len(stage.latencies[event])})")
+    print(f"  memory         {(memory_after - memory_before) / 1024:+,.0f} KiB traced, "
+          f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MiB")
+    print(f"  left behind    {len(duel_manager.store.room_ids())} duels, "
+          f"{len(duel_connections)} connections, {len(round_scheduler.timers)} timers")
+    errors = sum(stage.errors.values())
+    print(f"  errors         {errors}")
+    for error, count in sorted(stage.errors.items(), key=lambda item: -item[1]):
+        print(f"    {count:5d}  {error}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Duel load test')
+    parser.add_argument('--ramp', default='10,50,100', help='comma-separated concurrent duels per stage')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--time-limit', type=int, default=30)
+    parser.add_argument('--think', default='0.05,0.3', help='min,max seconds before answering')
+    parser.add_argument('--accuracy', type=float, default=0.8)
+    parser.add_argument('--result-delay', type=float, default=0.1, help='DUEL_RESULT_DELAY override')
+    parser.add_argument('--wire', choices=('json', 'binary'), default='json')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    args.think = tuple(float(value) for value in args.think.split(','))
+
+    app.config['DUEL_RESULT_DELAY'] = args.result_delay
+    tracemalloc.start()
+
+    errors = 0
+    for args.stage, concurrency in enumerate(int(value) for value in args.ramp.split(',')):
+        errors += run_stage(concurrency, args)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,78 @@ class Config:
     MAX_LEADERBOARD_ENTRIES = 1000
     MAX_SCORE_VALUE = 10000
     
+    # Maximum questions returned by one /get_question?count=N request
+    MAX_QUESTION_BATCH = 100
+    
+    # Maximum attempts accepted by one /api/attempts/batch request
+    MAX_ATTEMPT_BATCH = 500
+    
+    # Write-behind buffer for Progress/Analytics updates
+    WRITE_BEHIND_ENABLED = True
+    WRITE_BEHIND_INTERVAL_MS = 500
+    WRITE_BEHIND_MAX_ENTRIES = 1000
+    # Consecutive failed flushes retried (with backoff) before pending deltas are dropped
+    WRITE_BEHIND_MAX_RETRIES = 5
+    
+    # Per-user session statistics (LRU size and idle seconds before a new session starts)
+    SESSION_STATS_CAPACITY = 10000
+    SESSION_IDLE_TIMEOUT = 1800
+    
+    # Seconds a signed question token stays valid
+    QUESTION_TOKEN_MAX_AGE = 3600
+    
+    # Seconds to show round results before the next duel round starts
+    DUEL_RESULT_DELAY = 2
+    
+    # Persist the duel journal every N rounds (0 = only at duel end)
+    DUEL_CHECKPOINT_ROUNDS = 5
+    
+    # Accepted duel settings: rounds per duel and seconds per round
+    DUEL_MAX_ROUNDS = 50
+    DUEL_MIN_TIME_LIMIT = 5
+    DUEL_MAX_TIME_LIMIT = 300
+    
+    # Largest duel room, and how often coalesced duel events, standings and spectator deltas are sent (seconds)
+    DUEL_MAX_PLAYERS = 100
+    DUEL_BROADCAST_INTERVAL = 0.25
+    SPECTATOR_INTERVAL = 0.5
+    DUEL_WIRE_INTERVAL = 0.05
+    
+    # Latency pings to duel players, and the most RTT credited back to an answer (seconds)
+    LATENCY_PING_INTERVAL = 2
+    LATENCY_MAX_COMPENSATION = 1.0
+    
+    # Duel lifecycle: memory cap and sweeper timings (seconds)
+    MAX_ACTIVE_DUELS = 10000
+    DUEL_SWEEP_INTERVAL = 30
+    DUEL_WAITING_TTL = 600
+    DUEL_ACTIVE_TTL = 300
+    DUEL_DISCONNECT_GRACE = 15
+    
+    # Matchmaking: accepted rating gap starts at BASE_SPREAD and widens while a player waits
+    MATCHMAKING_BASE_SPREAD = 50
+    MATCHMAKING_SPREAD_PER_SECOND = 25
+    MATCHMAKING_MAX_SPREAD = 1000
+    MATCHMAKING_INTERVAL = 1
+    MATCHMAKING_TIMEOUT = 300
+    
+    # In-memory leaderboard rank index, and how often each worker picks up scores
+    # written by other workers (seconds; 0 = never, for a single worker)
+    LEADERBOARD_INDEX_ENABLED = True
+    LEADERBOARD_SYNC_INTERVAL = 5
+    
+    # Seconds the database COUNT(*) behind leaderboard totals is cached (index disabled)
+    LEADERBOARD_COUNT_TTL = 30
+    
+    # HTTP caching: pages that don't vary by user are cached this long, then revalidated by ETag (seconds)
+    PAGE_CACHE_MAX_AGE = 3600
+    
+    # Duel state backend: 'memory' (single worker) or 'redis' (shared between workers)
+    DUEL_STATE_BACKEND = os.environ.get('DUEL_STATE_BACKEND', 'memory')
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    # Set to the Redis URL when running more than one worker
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    
     # Database configuration
     @staticmethod
     def init_app(app):
@@ -55,6 +127,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    
+    # Write answers through synchronously so tests can assert on the database
+    WRITE_BEHIND_ENABLED = False
 
 # Configuration dictionary
 config = {
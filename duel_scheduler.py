@@ -0,0 +1,96 @@
+"""
+Non-blocking round scheduling and broadcast coalescing for duels.
+
+Round deadlines for every room sit in one heap that a single Socket.IO
+background task polls, so handlers never sleep. Scheduling a room again
+replaces its pending timer; replaced and cancelled entries are skipped lazily
+when they reach the top of the heap.
+
+RoomBroadcaster batches room updates: handlers mark a room as changed and a
+background task emits one message per changed room per tick.
+"""
+
+import heapq
+import itertools
+import time
+
+
+class RoundScheduler:
+    def __init__(self, socketio, resolution=0.05):
+        self.socketio = socketio
+        self.resolution = resolution
+        self.deadlines = []  # heap of (deadline, seq, room_id)
+        self.timers = {}     # {room_id: (seq, callback)}
+        self._seq = itertools.count()
+        self._running = False
+
+    def schedule(self, room_id, delay, callback):
+        """Run callback(room_id) after `delay` seconds, replacing any pending timer for the room."""
+        seq = next(self._seq)
+        self.timers[room_id] = (seq, callback)
+        heapq.heappush(self.deadlines, (time.monotonic() + delay, seq, room_id))
+        if not self._running:
+            self._running = True
+            self.socketio.start_background_task(self._run)
+
+    def cancel(self, room_id):
+        self.timers.pop(room_id, None)
+
+    def pending(self, room_id):
+        return room_id in self.timers
+
+    def run_due(self, now=None):
+        """Fire every timer whose deadline has passed."""
+        now = now if now is not None else time.monotonic()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, seq, room_id = heapq.heappop(self.deadlines)
+            timer = self.timers.get(room_id)
+            if timer is None or timer[0] != seq:
+                continue  # replaced or cancelled
+            del self.timers[room_id]
+            try:
+                timer[1](room_id)
+            except Exception as e:
+                print(f"Round scheduler error in room {room_id}: {e}")
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.resolution)
+            self.run_due()
+
+
+class RoomBroadcaster:
+    def __init__(self, socketio, event, build, interval=0.25, emit=None):
+        self.socketio = socketio
+        self.emit = emit or socketio.emit  # emit(event, payload, room=room_id)
+        self.event = event
+        self.build = build  # build(room_id) -> payload, or None to skip
+        self.interval = interval
+        self.dirty = set()
+        self._running = False
+
+    def mark(self, room_id):
+        """Queue one `event` emit for the room at the next tick."""
+        self.dirty.add(room_id)
+        if not self._running:
+            self._running = True
+            self.socketio.start_background_task(self._run)
+
+    def discard(self, room_id):
+        self.dirty.discard(room_id)
+
+    def flush(self):
+        rooms, self.dirty = self.dirty, set()
+        for room_id in rooms:
+            try:
+                payload = self.build(room_id)
+                if payload is not None:
+                    self.emit(self.event, payload, room=room_id)
+            except Exception as e:
+                print(f"Broadcast error in room {room_id}: {e}")
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            if self.dirty:
+                self.flush()
@@ -0,0 +1,109 @@
+"""
+Throttled spectator feed for live duels.
+
+Spectators join a separate Socket.IO room per duel, so they never see the
+players' per-answer and per-round events. Once per tick the feed builds one
+snapshot for every watched duel, diffs it against the last snapshot sent and
+emits the delta to the whole spectator room. The cost per tick is one
+snapshot and one emit per watched duel, however many people are watching.
+
+Deltas carry ``version`` and ``base``; a client whose version doesn't match
+``base`` asks for a fresh full snapshot.
+"""
+
+
+def spectator_room(room_id):
+    return f'spectate:{room_id}'
+
+
+def snapshot_delta(old, new):
+    """Return (set, merge): top-level keys to replace and dicts to merge key by key."""
+    replace, merge = {}, {}
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict) and previous.keys() <= value.keys():
+            merge[key] = {k: v for k, v in value.items() if k not in previous or previous[k] != v}
+        else:
+            replace[key] = value
+    return replace, merge
+
+
+class SpectatorFeed:
+    def __init__(self, socketio, build, interval=0.5):
+        self.socketio = socketio
+        self.build = build          # build(room_id) -> snapshot dict, or None once the duel is gone
+        self.interval = interval
+        self.viewers = {}           # {room_id: {sid, ...}}
+        self.sids = {}              # {sid: room_id}
+        self.snapshots = {}         # {room_id: (version, snapshot)} last state sent to the room
+        self._running = False
+
+    def watch(self, sid, room_id):
+        """Register a spectator and return the full (version, snapshot) to send them."""
+        self.unwatch(sid)
+        self.viewers.setdefault(room_id, set()).add(sid)
+        self.sids[sid] = room_id
+        if room_id not in self.snapshots:
+            snapshot = self.build(room_id)
+            if snapshot is None:
+                self.unwatch(sid)
+                return None
+            self.snapshots[room_id] = (0, snapshot)
+        if not self._running:
+            self._running = True
+            self.socketio.start_background_task(self._run)
+        return self.snapshots[room_id]
+
+    def unwatch(self, sid):
+        room_id = self.sids.pop(sid, None)
+        if room_id is None:
+            return None
+        viewers = self.viewers.get(room_id)
+        viewers.discard(sid)
+        if not viewers:
+            del self.viewers[room_id]
+            self.snapshots.pop(room_id, None)
+        return room_id
+
+    def spectators(self, room_id):
+        return len(self.viewers.get(room_id, ()))
+
+    def end(self, room_id, result):
+        """Send the final result to a duel's spectators and forget the room."""
+        if room_id not in self.viewers:
+            return
+        self.socketio.emit('duel_ended', result, room=spectator_room(room_id))
+        for sid in self.viewers.pop(room_id):
+            self.sids.pop(sid, None)
+        self.snapshots.pop(room_id, None)
+        self.socketio.close_room(spectator_room(room_id))
+
+    def tick(self):
+        """Emit one delta per watched duel whose state changed since the last tick."""
+        for room_id in list(self.viewers):
+            try:
+                snapshot = self.build(room_id)
+                if snapshot is None:
+                    self.end(room_id, {'status': 'ended'})
+                    continue
+                version, previous = self.snapshots[room_id]
+                replace, merge = snapshot_delta(previous, snapshot)
+                if not replace and not merge:
+                    continue
+                self.snapshots[room_id] = (version + 1, snapshot)
+                self.socketio.emit('spectator_delta', {
+                    'version': version + 1,
+                    'base': version,
+                    'set': replace,
+                    'merge': merge
+                }, room=spectator_room(room_id))
+            except Exception as e:
+                print(f"Spectator feed error in room {room_id}: {e}")
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            if self.viewers:
+                self.tick()
@@ -0,0 +1,170 @@
+"""
+State stores for DuelManager.
+
+MemoryDuelStore keeps duels in process-local dicts (single worker).
+RedisDuelStore keeps them in Redis so several workers can serve the same
+duels; combine it with SOCKETIO_MESSAGE_QUEUE so room broadcasts cross
+processes. Select one with the DUEL_STATE_BACKEND config value.
+
+Callers must wrap read-modify-write sequences in ``store.lock(room_id)`` and
+call ``save`` after mutating a duel.
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class MemoryDuelStore:
+    def __init__(self):
+        self.duels = {}         # {room_id: duel_data}
+        self.player_rooms = {}  # {user_id: room_id}
+        self._locks = {}
+
+    @contextmanager
+    def lock(self, room_id):
+        # Locks exist only for stored rooms, so unknown room ids leave nothing behind
+        room_lock = self._locks.get(room_id)
+        if room_lock is None:
+            yield
+            return
+        with room_lock:
+            yield
+
+    def get(self, room_id):
+        return self.duels.get(room_id)
+
+    def save(self, room_id, duel_data):
+        self._locks.setdefault(room_id, threading.RLock())
+        self.duels[room_id] = duel_data
+
+    def delete(self, room_id):
+        self.duels.pop(room_id, None)
+        self._locks.pop(room_id, None)
+
+    def room_ids(self):
+        return list(self.duels)
+
+    def get_player_room(self, user_id):
+        return self.player_rooms.get(user_id)
+
+    def set_player_room(self, user_id, room_id):
+        self.player_rooms[user_id] = room_id
+
+    def clear_player_room(self, user_id):
+        self.player_rooms.pop(user_id, None)
+
+
+def encode_duel(duel_data):
+    data = dict(duel_data)
+    data['scores'] = [[user_id, score] for user_id, score in duel_data['scores'].items()]
+    data['answered'] = sorted(duel_data.get('answered', ()))
+    data['forfeited'] = sorted(duel_data.get('forfeited', ()))
+    data['disconnected'] = [[user_id, since] for user_id, since in duel_data.get('disconnected', {}).items()]
+    if duel_data.get('question_start_time'):
+        data['question_start_time'] = duel_data['question_start_time'].isoformat()
+    return json.dumps(data)
+
+
+def decode_duel(raw):
+    data = json.loads(raw)
+    data['scores'] = {user_id: score for user_id, score in data['scores']}
+    data['answered'] = set(data.get('answered', ()))
+    data['forfeited'] = set(data.get('forfeited', ()))
+    data['disconnected'] = {user_id: since for user_id, since in data.get('disconnected', ())}
+    if data.get('question_start_time'):
+        data['question_start_time'] = datetime.fromisoformat(data['question_start_time'])
+    return data
+
+
+class RedisDuelStore:
+    """Duel state shared between workers through any Redis-protocol server."""
+
+    def __init__(self, url, prefix='duel', lock_timeout=10):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    def _key(self, room_id):
+        return f'{self.prefix}:room:{room_id}'
+
+    @contextmanager
+    def lock(self, room_id):
+        with self.client.lock(f'{self.prefix}:lock:{room_id}', timeout=self.lock_timeout):
+            yield
+
+    def get(self, room_id):
+        raw = self.client.get(self._key(room_id))
+        return decode_duel(raw) if raw else None
+
+    def save(self, room_id, duel_data):
+        pipe = self.client.pipeline()
+        pipe.set(self._key(room_id), encode_duel(duel_data))
+        pipe.sadd(f'{self.prefix}:rooms', room_id)
+        pipe.execute()
+
+    def delete(self, room_id):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(room_id))
+        pipe.srem(f'{self.prefix}:rooms', room_id)
+        pipe.execute()
+
+    def room_ids(self):
+        return [room_id.decode() for room_id in self.client.smembers(f'{self.prefix}:rooms')]
+
+    def get_player_room(self, user_id):
+        room_id = self.client.hget(f'{self.prefix}:players', user_id)
+        return room_id.decode() if room_id else None
+
+    def set_player_room(self, user_id, room_id):
+        self.client.hset(f'{self.prefix}:players', user_id, room_id)
+
+    def clear_player_room(self, user_id):
+        self.client.hdel(f'{self.prefix}:players', user_id)
+
+
+def create_duel_store(app):
+    backend = app.config.get('DUEL_STATE_BACKEND', 'memory')
+    if backend == 'redis':
+        return RedisDuelStore(app.config['REDIS_URL'])
+    if backend == 'memory':
+        return MemoryDuelStore()
+    raise ValueError(f'Unknown DUEL_STATE_BACKEND: {backend}')
+
+
+class ConnectionIndex:
+    """Per-process sid -> (user_id, room_id) index for Socket.IO connections."""
+
+    def __init__(self):
+        self.sids = {}   # {sid: (user_id, room_id)}
+        self.users = {}  # {(user_id, room_id): {sid, ...}}
+
+    def __len__(self):
+        return len(self.sids)
+
+    def bind(self, sid, user_id, room_id):
+        self.unbind(sid)
+        self.sids[sid] = (user_id, room_id)
+        self.users.setdefault((user_id, room_id), set()).add(sid)
+
+    def unbind(self, sid):
+        """Forget a connection and return its (user_id, room_id), if any."""
+        binding = self.sids.pop(sid, None)
+        if binding is not None:
+            sids = self.users.get(binding)
+            sids.discard(sid)
+            if not sids:
+                del self.users[binding]
+        return binding
+
+    def drop_room(self, room_id):
+        """Forget every connection bound to a closed room."""
+        for user_id, bound_room in [key for key in self.users if key[1] == room_id]:
+            for sid in self.users.pop((user_id, bound_room)):
+                self.sids.pop(sid, None)
+
+    def is_connected(self, user_id, room_id):
+        return (user_id, room_id) in self.users
@@ -0,0 +1,192 @@
+"""
+Compact wire format and per-tick coalescing for duel events.
+
+Clients pick a format when they connect: 'json' (default) or 'binary'.
+Binary clients get fixed-layout frames sent as a Socket.IO binary
+attachment, so keys and numbers are never spelled out as text. Everything
+queued for one room (or one connection) within a tick is sent together:
+one ``duel_frame`` for binary clients, or a ``duel_batch`` list of
+[event, payload] pairs for JSON clients when there is more than one event.
+
+Frames are a concatenation of messages; every message starts with a one-byte
+event code and is laid out big-endian:
+
+    round_started  B code, H round, H time_limit, i a, B op, i b
+    answer_result  B code, B correct, H points, I total_score, f response_time, f network_delay
+    standings      B code, H round, H answered, H players, H n, n x (I user_id, I score, B forfeited)
+    duel_ended     B code, B status, I winner, H total_rounds, I forfeited_by, H n, n x (I user_id, i score)
+
+User ids of 0 mean "none"; standings are sent best first. A batch holding a
+value that doesn't fit its field goes to binary clients as JSON instead,
+which they also understand.
+"""
+
+import struct
+
+FORMATS = ('json', 'binary')
+
+EVENT_CODES = {'round_started': 1, 'answer_result': 2, 'standings': 3, 'duel_ended': 4}
+EVENT_NAMES = {code: event for event, code in EVENT_CODES.items()}
+END_STATUSES = ('completed', 'expired', 'ended')
+
+ROUND_STARTED = struct.Struct('!BHHiBi')
+ANSWER_RESULT = struct.Struct('!BBHIff')
+STANDINGS = struct.Struct('!BHHHH')
+STANDING = struct.Struct('!IIB')
+DUEL_ENDED = struct.Struct('!BBIHIH')
+FINAL_SCORE = struct.Struct('!Ii')
+
+
+def wire_room(room_id, wire_format):
+    return f'{room_id}:{wire_format}'
+
+
+def encode_message(event, payload):
+    code = EVENT_CODES[event]
+    if event == 'round_started':
+        a, operation, b = payload['question'].split(' ')
+        return ROUND_STARTED.pack(code, payload['round'], payload['time_limit'], int(a), ord(operation), int(b))
+    if event == 'answer_result':
+        return ANSWER_RESULT.pack(
+            code, payload['correct'], payload['points'], payload['total_score'],
+            payload['response_time'], payload.get('network_delay', 0.0)
+        )
+    if event == 'standings':
+        entries = payload['standings']
+        return STANDINGS.pack(code, payload['round'], payload['answered'], payload['players'], len(entries)) + b''.join(
+            STANDING.pack(entry['user_id'], entry['score'], entry['forfeited']) for entry in entries
+        )
+    ranking = payload.get('standings', [])
+    return DUEL_ENDED.pack(
+        code, END_STATUSES.index(payload['status']), payload.get('winner') or 0,
+        payload.get('total_rounds', 0), payload.get('forfeited_by') or 0, len(ranking)
+    ) + b''.join(FINAL_SCORE.pack(user_id, payload['final_scores'][user_id]) for user_id in ranking)
+
+
+def encode_frame(messages):
+    """Pack [(event, payload), ...] into one binary frame."""
+    return b''.join(encode_message(event, payload) for event, payload in messages)
+
+
+def decode_frame(frame):
+    """Unpack a binary frame into [(event, payload), ...] matching the JSON payloads."""
+    messages = []
+    offset = 0
+    while offset < len(frame):
+        event = EVENT_NAMES[frame[offset]]
+        if event == 'round_started':
+            _, round_number, time_limit, a, operation, b = ROUND_STARTED.unpack_from(frame, offset)
+            offset += ROUND_STARTED.size
+            payload = {'question': f'{a} {chr(operation)} {b}', 'round': round_number, 'time_limit': time_limit}
+        elif event == 'answer_result':
+            _, correct, points, total_score, response_time, network_delay = ANSWER_RESULT.unpack_from(frame, offset)
+            offset += ANSWER_RESULT.size
+            payload = {
+                'correct': bool(correct), 'points': points, 'total_score': total_score,
+                'response_time': round(response_time, 3), 'network_delay': round(network_delay, 3)
+            }
+        elif event == 'standings':
+            _, round_number, answered, players, count = STANDINGS.unpack_from(frame, offset)
+            offset += STANDINGS.size
+            standings = []
+            for rank in range(1, count + 1):
+                user_id, score, forfeited = STANDING.unpack_from(frame, offset)
+                offset += STANDING.size
+                standings.append({'user_id': user_id, 'score': score, 'rank': rank, 'forfeited': bool(forfeited)})
+            payload = {'round': round_number, 'answered': answered, 'players': players, 'standings': standings}
+        else:
+            _, status, winner, total_rounds, forfeited_by, count = DUEL_ENDED.unpack_from(frame, offset)
+            offset += DUEL_ENDED.size
+            final_scores = {}
+            for _ in range(count):
+                user_id, score = FINAL_SCORE.unpack_from(frame, offset)
+                offset += FINAL_SCORE.size
+                final_scores[user_id] = score
+            payload = {
+                'status': END_STATUSES[status], 'winner': winner or None, 'final_scores': final_scores,
+                'standings': list(final_scores), 'total_rounds': total_rounds
+            }
+            if forfeited_by:
+                payload['forfeited_by'] = forfeited_by
+        messages.append((event, payload))
+    return messages
+
+
+class DuelWire:
+    def __init__(self, socketio, interval=0.05):
+        self.socketio = socketio
+        self.interval = interval
+        self.formats = {}   # {sid: 'binary'}; connections not listed use JSON
+        self.pending = {}   # {(target, wire_format): [(event, payload), ...]}
+        self._running = False
+
+    def negotiate(self, sid, requested):
+        """Record the format a connection asked for and return the one it gets."""
+        if requested == 'binary':
+            self.formats[sid] = 'binary'
+            return 'binary'
+        return 'json'
+
+    def format_of(self, sid):
+        return self.formats.get(sid, 'json')
+
+    def forget(self, sid):
+        self.formats.pop(sid, None)
+        for wire_format in FORMATS:
+            self.pending.pop((sid, wire_format), None)
+
+    def emit(self, event, payload, room=None, to=None):
+        """Queue a duel event for a duel room (both formats) or for one connection."""
+        if room is not None:
+            targets = [(wire_room(room, wire_format), wire_format) for wire_format in FORMATS]
+        else:
+            targets = [(to, self.format_of(to))]
+        for target in targets:
+            self.pending.setdefault(target, []).append((event, payload))
+        if not self._running:
+            self._running = True
+            self.socketio.start_background_task(self._run)
+
+    def flush(self, room_id=None):
+        """Send everything queued, or only what is queued for one duel room."""
+        if room_id is None:
+            batches, self.pending = self.pending, {}
+        else:
+            batches = {}
+            for wire_format in FORMATS:
+                target = (wire_room(room_id, wire_format), wire_format)
+                if target in self.pending:
+                    batches[target] = self.pending.pop(target)
+        for (target, wire_format), messages in batches.items():
+            try:
+                self._send(target, wire_format, messages)
+            except Exception as e:
+                print(f"Duel wire error for {target}: {e}")
+
+    def _send(self, target, wire_format, messages):
+        if wire_format == 'binary':
+            try:
+                frame = encode_frame(messages)
+            except struct.error as e:
+                # A value outside a field's range: send this batch as JSON rather than drop it
+                print(f"Duel wire frame for {target} sent as JSON: {e}")
+                self._send(target, 'json', messages)
+            else:
+                self.socketio.emit('duel_frame', frame, room=target)
+        elif len(messages) == 1:
+            self.socketio.emit(messages[0][0], messages[0][1], room=target)
+        else:
+            self.socketio.emit('duel_batch', [[event, payload] for event, payload in messages], room=target)
+
+    def close_room(self, room_id):
+        # Flush everything, not just the room, so players' own queued events
+        # (e.g. their last answer_result) still arrive before duel_ended
+        self.flush()
+        for wire_format in FORMATS:
+            self.socketio.close_room(wire_room(room_id, wire_format))
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            if self.pending:
+                self.flush()
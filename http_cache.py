@@ -0,0 +1,64 @@
+"""
+Per-route HTTP cache policy.
+
+Routes opt in with ``conditional``: a Cache-Control header plus an ETag
+checked *before* the view runs, so a matching If-None-Match is answered with
+304 without rendering anything or running the view's queries. Routes that
+don't opt in keep the old ``no-store`` headers, so per-user pages and API
+writes are never cached.
+"""
+
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+
+NO_STORE = 'no-cache, no-store, must-revalidate'
+
+
+def etag_for(*parts):
+    """Short, stable ETag value for any repr-able parts."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def conditional(value, etag):
+    """Decorator: Cache-Control `value` plus an ETag from ``etag(**view_kwargs)``.
+
+    `etag` runs before the view on every request, including the ones answered
+    with 304, so it must be cheap: no rendering and no per-request queries.
+    It may refresh shared in-process state the view reads as well (the
+    leaderboard ETag loads, syncs and rolls over its index, which can query
+    or delete), so that the tag describes what the view will serve.
+    Returning None skips the check and runs the view as usual.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            tag = etag(**kwargs)
+            if tag is not None and request.if_none_match.contains_weak(tag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            if tag is not None:
+                response.set_etag(tag)
+            return response
+        wrapper.cache_control = value
+        return wrapper
+    return decorator
+
+
+def apply_cache_policy(response, view):
+    """after_request helper: the view's Cache-Control, or no-store for views without a policy."""
+    value = getattr(view, 'cache_control', None)
+    # Errors are never cached, whatever the route's policy
+    if value is None or response.status_code not in (200, 304):
+        response.headers['Cache-Control'] = NO_STORE
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+    else:
+        response.headers['Cache-Control'] = value
+        if value.startswith('private'):
+            response.vary.add('Cookie')
+    return response
@@ -0,0 +1,133 @@
+"""
+Round-trip latency tracking for Socket.IO connections.
+
+The server pings every duel room with a sequence number and times each
+player's pong. Each connection keeps a smoothed RTT and jitter (mean
+deviation) in the style of TCP's retransmission timer (RFC 6298), and every
+sample also lands in a global and a per-room histogram with fixed buckets.
+"""
+
+import bisect
+import time
+
+# Upper bounds of the histogram buckets, in milliseconds; the last bucket is open
+BUCKETS_MS = (5, 10, 25, 50, 75, 100, 150, 250, 400, 600, 1000, 2000, 5000)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (None if open-ended or empty)."""
+        if not self.total:
+            return None
+        target = self.total * p / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else None
+        return None
+
+    def to_dict(self):
+        return {
+            'count': self.total,
+            'mean_ms': round(self.sum_ms / self.total, 1) if self.total else None,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            # [[upper bound in ms, count], ...]; the open last bucket has bound None
+            'buckets': [[bound, count] for bound, count in zip(BUCKETS_MS + (None,), self.counts)]
+        }
+
+
+class RttEstimator:
+    """Smoothed round-trip time and jitter for one connection, in seconds."""
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self):
+        self.srtt = None
+        self.jitter = 0.0
+        self.samples = 0
+
+    def add(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.jitter = rtt / 2
+        else:
+            self.jitter += self.BETA * (abs(self.srtt - rtt) - self.jitter)
+            self.srtt += self.ALPHA * (rtt - self.srtt)
+        self.samples += 1
+
+    def to_dict(self):
+        return {
+            'rtt_ms': round(self.srtt * 1000, 1) if self.srtt is not None else None,
+            'jitter_ms': round(self.jitter * 1000, 1),
+            'samples': self.samples
+        }
+
+
+class LatencyTracker:
+    def __init__(self, max_compensation=1.0):
+        # Caps how much network delay is credited back, so a client can't
+        # stretch its answer window by delaying pongs
+        self.max_compensation = max_compensation
+        self.connections = {}   # {sid: RttEstimator}
+        self.histogram = LatencyHistogram()
+        self.rooms = {}         # {room_id: LatencyHistogram}
+        self.pings = {}         # {seq: monotonic time the ping was sent}
+        self.seq = 0
+
+    def ping(self):
+        """Start a ping round and return its sequence number."""
+        self.seq += 1
+        now = time.monotonic()
+        self.pings[self.seq] = now
+        # Pongs for pings older than a few seconds are no longer useful
+        for seq in [seq for seq, sent in self.pings.items() if now - sent > 10]:
+            del self.pings[seq]
+        return self.seq
+
+    def pong(self, sid, seq, room_id=None):
+        """Record a pong; returns the RTT sample in seconds, or None for unknown pings."""
+        sent = self.pings.get(seq)
+        if sent is None:
+            return None
+        rtt = time.monotonic() - sent
+        self.connections.setdefault(sid, RttEstimator()).add(rtt)
+        self.histogram.observe(rtt * 1000)
+        # Only rooms registered with track_room get a histogram
+        if room_id in self.rooms:
+            self.rooms[room_id].observe(rtt * 1000)
+        return rtt
+
+    def network_delay(self, sid):
+        """Estimated time a round trip adds to an answer: one-way delay out plus one back."""
+        estimator = self.connections.get(sid)
+        if estimator is None or estimator.srtt is None:
+            return 0.0
+        return min(estimator.srtt, self.max_compensation)
+
+    def estimate(self, sid):
+        estimator = self.connections.get(sid)
+        return estimator.to_dict() if estimator else None
+
+    def forget(self, sid):
+        self.connections.pop(sid, None)
+
+    def track_room(self, room_id):
+        """Start a per-room histogram for a live duel room (kept until drop_room)."""
+        self.rooms.setdefault(room_id, LatencyHistogram())
+
+    def drop_room(self, room_id):
+        self.rooms.pop(room_id, None)
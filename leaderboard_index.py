@@ -0,0 +1,142 @@
+"""
+In-memory ranked leaderboard index.
+
+Every mode keeps its entries in one list sorted by (-score, created_at,
+user_id), the same order as the leaderboard query, so an entry's position is
+its rank. sortedcontainers keeps the list as a tree of sublists with a
+positional index: inserts, removals, rank lookups and page starts are all
+O(log n), and a page costs O(log n + page size) with no OFFSET scan and no
+COUNT(*). Pages can also start after an opaque cursor naming the last entry
+seen, which stays valid while scores move around it.
+
+The index is loaded from LeaderboardScore once and then updated as scores are
+submitted. Each process holds its own copy; with several workers, ``sync``
+picks up scores the other workers wrote.
+"""
+
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sortedcontainers import SortedList
+
+LeaderboardEntry = namedtuple('LeaderboardEntry', ['neg_score', 'created_at', 'user_id'])
+
+# Rows without a timestamp sort first among equal scores, as SQLite orders NULLs
+NO_TIMESTAMP = datetime.min
+
+
+def entry_key(score, created_at, user_id):
+    return LeaderboardEntry(-score, created_at or NO_TIMESTAMP, user_id)
+
+
+def encode_cursor(entry):
+    """Opaque ``after=`` cursor for the page entry (as returned by ``page``) a page ended on."""
+    position = [entry['rank'], entry['score'], entry['created_at'], entry['user_id']]
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (rank, LeaderboardEntry) for a cursor; raises ValueError if it is malformed."""
+    try:
+        rank, score, created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        created_at = datetime.fromisoformat(created_at) if created_at is not None else None
+        return int(rank), entry_key(int(score), created_at, int(user_id))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid leaderboard cursor: {cursor!r}') from e
+
+
+class LeaderboardIndex:
+    def __init__(self, modes):
+        self.entries = {mode: SortedList() for mode in modes}  # LeaderboardEntry, best first
+        self.keys = {mode: {} for mode in modes}               # {user_id: LeaderboardEntry}
+        self.usernames = {}                                    # {user_id: username}
+        self.loaded = False
+        self.synced_at = None  # wall-clock (UTC) time of the last load or sync
+
+    def __contains__(self, mode):
+        return mode in self.entries
+
+    def load(self, rows, synced_at=None):
+        """Replace the index with rows of (user_id, mode, score, created_at, username)."""
+        keys = {mode: {} for mode in self.entries}
+        for user_id, mode, score, created_at, username in rows:
+            if mode in keys:
+                keys[mode][user_id] = entry_key(score, created_at, user_id)
+                self.usernames[user_id] = username
+        for mode, by_user in keys.items():
+            self.entries[mode] = SortedList(by_user.values())
+        self.keys = keys
+        self.loaded = True
+        self.synced_at = synced_at or datetime.utcnow()
+
+    def sync(self, rows, synced_at=None):
+        """Apply rows written since the last load or sync (by any worker); returns how many changed."""
+        changed = 0
+        for user_id, mode, score, created_at, username in rows:
+            changed += self.update(mode, user_id, score, created_at, username)
+        self.synced_at = synced_at or datetime.utcnow()
+        return changed
+
+    def update(self, mode, user_id, score, created_at, username=None):
+        """Record a user's best score; returns True if their entry changed."""
+        if mode not in self.entries:
+            return False
+        if username is not None:
+            self.usernames[user_id] = username
+        key = entry_key(score, created_at, user_id)
+        current = self.keys[mode].get(user_id)
+        if current == key:
+            return False
+        if current is not None:
+            # Stored scores only ever go up; ignore stale rows from a sync
+            if current.neg_score < key.neg_score:
+                return False
+            self.entries[mode].remove(current)
+        self.entries[mode].add(key)
+        self.keys[mode][user_id] = key
+        return True
+
+    def rename(self, user_id, username):
+        if user_id in self.usernames:
+            self.usernames[user_id] = username
+
+    def total(self, mode):
+        return len(self.entries[mode])
+
+    def rank(self, mode, user_id):
+        """1-based rank of a user's best score, or None if they have no score in `mode`."""
+        key = self.keys[mode].get(user_id)
+        if key is None:
+            return None
+        return self.entries[mode].index(key) + 1
+
+    def page(self, mode, offset, limit):
+        """Entries ranked offset+1 .. offset+limit as dicts, best first."""
+        entries = self.entries[mode]
+        return [
+            self._entry(rank, key)
+            for rank, key in enumerate(entries.islice(offset, offset + limit), offset + 1)
+        ]
+
+    def around(self, mode, user_id, k):
+        """(rank, entries) for a user plus up to `k` entries either side; (None, []) without a score."""
+        rank = self.rank(mode, user_id)
+        if rank is None:
+            return None, []
+        start = max(rank - 1 - k, 0)
+        return rank, self.page(mode, start, rank - start + k)
+
+    def page_after(self, mode, key, limit):
+        """Up to `limit` entries ranked below `key`, which need not be in the index any more."""
+        return self.page(mode, self.entries[mode].bisect_right(key), limit)
+
+    def _entry(self, rank, key):
+        return {
+            'rank': rank,
+            'user_id': key.user_id,
+            'username': self.usernames.get(key.user_id),
+            'score': -key.neg_score,
+            'created_at': key.created_at.isoformat() if key.created_at is not NO_TIMESTAMP else None
+        }
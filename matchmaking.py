@@ -0,0 +1,106 @@
+"""
+Skill-based matchmaking queue for duels.
+
+Waiting players sit in one list sorted by (rating, enqueued_at, user_id).
+A new player is compared with its two neighbours in rating order, so joining
+the queue and pairing both cost O(log n). Each player accepts opponents
+within a rating spread that widens the longer they wait; a periodic ``match``
+pass pairs adjacent players whose spreads have grown enough to meet.
+
+The queue is process-local: with several workers, run matchmaking on one.
+"""
+
+import time
+from collections import namedtuple
+
+from sortedcontainers import SortedList
+
+QueueEntry = namedtuple('QueueEntry', ['rating', 'enqueued_at', 'user_id'])
+
+
+class MatchmakingQueue:
+    def __init__(self, base_spread=50, spread_per_second=25, max_spread=1000):
+        self.base_spread = base_spread
+        self.spread_per_second = spread_per_second
+        self.max_spread = max_spread
+        self.entries = SortedList()  # QueueEntry, ordered by rating
+        self.players = {}            # {user_id: QueueEntry}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, user_id):
+        return user_id in self.players
+
+    def spread(self, entry, now):
+        """Largest rating gap `entry` accepts after waiting until `now`."""
+        waited = max(0.0, now - entry.enqueued_at)
+        return min(self.max_spread, self.base_spread + self.spread_per_second * waited)
+
+    def _acceptable(self, a, b, now):
+        # The longer-waiting player's tolerance decides
+        return abs(a.rating - b.rating) <= max(self.spread(a, now), self.spread(b, now))
+
+    def enqueue(self, user_id, rating, now=None):
+        """Queue a player, or pair them at once.
+
+        Returns the opponent's QueueEntry if a match was made (both players are
+        removed from the queue), otherwise None.
+        """
+        now = now if now is not None else time.time()
+        self.dequeue(user_id)
+        entry = QueueEntry(rating, now, user_id)
+
+        index = self.entries.bisect_left(entry)
+        neighbours = [self.entries[i] for i in (index - 1, index) if 0 <= i < len(self.entries)]
+        neighbours = [other for other in neighbours if self._acceptable(entry, other, now)]
+        if neighbours:
+            opponent = min(neighbours, key=lambda other: abs(other.rating - rating))
+            self.dequeue(opponent.user_id)
+            return opponent
+
+        self.entries.add(entry)
+        self.players[user_id] = entry
+        return None
+
+    def dequeue(self, user_id):
+        """Remove a player from the queue; returns their entry, if queued."""
+        entry = self.players.pop(user_id, None)
+        if entry is not None:
+            self.entries.remove(entry)
+        return entry
+
+    def match(self, now=None):
+        """Pair adjacent players whose widened spreads now overlap.
+
+        One O(n) pass over the queue; returns [(entry, entry), ...] and removes
+        the paired players.
+        """
+        now = now if now is not None else time.time()
+        pairs = []
+        pending = None
+        for entry in self.entries:
+            if pending is not None and self._acceptable(pending, entry, now):
+                pairs.append((pending, entry))
+                pending = None
+            else:
+                pending = entry
+
+        for a, b in pairs:
+            self.dequeue(a.user_id)
+            self.dequeue(b.user_id)
+        return pairs
+
+    def expire(self, max_wait, now=None):
+        """Drop and return players who have waited longer than `max_wait` seconds."""
+        now = now if now is not None else time.time()
+        expired = [entry for entry in self.entries if now - entry.enqueued_at > max_wait]
+        for entry in expired:
+            self.dequeue(entry.user_id)
+        return expired
+
+    def wait_time(self, user_id, now=None):
+        entry = self.players.get(user_id)
+        if entry is None:
+            return None
+        return (now if now is not None else time.time()) - entry.enqueued_at
@@ -11,8 +11,11 @@ from datetime import datetime
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# The app refuses to start on an outdated schema; this script is what updates it
+os.environ['SKIP_SCHEMA_CHECK'] = '1'
+
 from app import app, db
-from models import User, Progress, Analytics, LearningPath, LeaderboardScore
+from models import User, Progress, Analytics, LearningPath, LeaderboardScore, schema_problems
 
 def create_tables():
     """Create all database tables"""
@@ -66,11 +69,13 @@ def add_sample_data():
 
 def check_database_status():
     """Check the current status of the database"""
+    from sqlalchemy import inspect
+    
     print("Checking database status...")
     with app.app_context():
         try:
             # Check if tables exist
-            tables = db.engine.table_names()
+            tables = inspect(db.engine).get_table_names()
             print(f"📊 Found {len(tables)} tables: {', '.join(tables)}")
             
             # Count records in each table
@@ -96,10 +101,121 @@ def check_database_status():
                     print(f"  {mode.capitalize()}: {top_score.score} by {top_score.user.username}")
                 else:
                     print(f"  {mode.capitalize()}: No scores yet")
+            
+            problems = schema_problems()
+            if problems:
+                print("\n⚠️  Schema out of date (run 'python migrate_db.py upgrade'):")
+                for problem in problems:
+                    print(f"  - {problem}")
+            else:
+                print("\n✅ Schema up to date")
                     
         except Exception as e:
             print(f"❌ Error checking database: {e}")
 
+def add_unique_keys():
+    """Collapse duplicate rows and rebuild the upsert indexes as UNIQUE"""
+    from sqlalchemy import inspect, text
+    
+    print("Adding unique keys to Progress, Analytics and LeaderboardScore...")
+    with app.app_context():
+        def collapse(model, key_columns, merge):
+            survivors = {}
+            removed = 0
+            for row in model.query.order_by(model.id).all():
+                key = tuple(getattr(row, column) for column in key_columns)
+                if key in survivors:
+                    merge(survivors[key], row)
+                    db.session.delete(row)
+                    removed += 1
+                else:
+                    survivors[key] = row
+            return removed
+        
+        def merge_progress(keep, dup):
+            keep.total_attempts = (keep.total_attempts or 0) + (dup.total_attempts or 0)
+            keep.correct_answers = (keep.correct_answers or 0) + (dup.correct_answers or 0)
+            keep.last_attempt = max(filter(None, [keep.last_attempt, dup.last_attempt]), default=None)
+        
+        def merge_analytics(keep, dup):
+            attempts = (keep.questions_attempted or 0) + (dup.questions_attempted or 0)
+            if attempts:
+                keep.average_response_time = (
+                    (keep.average_response_time or 0.0) * (keep.questions_attempted or 0)
+                    + (dup.average_response_time or 0.0) * (dup.questions_attempted or 0)
+                ) / attempts
+            keep.questions_attempted = attempts
+            keep.correct_answers = (keep.correct_answers or 0) + (dup.correct_answers or 0)
+            keep.session_duration = max(keep.session_duration or 0, dup.session_duration or 0)
+        
+        def merge_leaderboard(keep, dup):
+            if dup.score > keep.score:
+                keep.score = dup.score
+                keep.created_at = dup.created_at
+        
+        # Only rebuild indexes that aren't unique yet, so running this on every deploy is cheap
+        inspector = inspect(db.engine)
+        pending = [
+            (model, key_columns, merge, index_name)
+            for model, key_columns, merge, index_name in [
+                (Progress, ['user_id', 'operation'], merge_progress, 'idx_progress_user_operation'),
+                (Analytics, ['user_id', 'session_date'], merge_analytics, 'idx_analytics_user_date'),
+                (LeaderboardScore, ['user_id', 'mode'], merge_leaderboard, 'idx_leaderboard_user_mode'),
+            ]
+            if not any(index['name'] == index_name and index['unique']
+                       for index in inspector.get_indexes(model.__tablename__))
+        ]
+        if not pending:
+            print("✅ Unique indexes already in place")
+            return
+        
+        removed = sum(collapse(model, key_columns, merge) for model, key_columns, merge, _ in pending)
+        db.session.commit()
+        print(f"✅ Collapsed {removed} duplicate rows")
+        
+        for model, _, _, index_name in pending:
+            index = next(i for i in model.__table__.indexes if i.name == index_name)
+            db.session.execute(text(f'DROP INDEX IF EXISTS {index_name}'))
+            db.session.commit()
+            index.create(db.engine)
+        print("✅ Unique indexes created successfully!")
+
+def add_missing_columns():
+    """Add model columns that are missing from existing tables (nullable columns only)"""
+    from sqlalchemy import inspect, text
+    
+    print("Adding missing columns...")
+    with app.app_context():
+        inspector = inspect(db.engine)
+        added = 0
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"  + {table.name}.{column.name} ({column_type})")
+                added += 1
+        db.session.commit()
+        print(f"✅ Added {added} columns")
+
+def upgrade_database():
+    """Bring an existing database up to the current models; safe to run on every deploy"""
+    create_tables()
+    add_missing_columns()
+    add_unique_keys()
+    with app.app_context():
+        problems = schema_problems()
+    if problems:
+        print("❌ Schema still out of date:")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("✅ Database schema is up to date")
+
 def backup_database():
     """Create a backup of the current database"""
     import shutil
@@ -131,6 +247,9 @@ Commands:
   backup     - Create a backup of the current database
   reset      - Drop all tables and recreate them (WARNING: deletes all data!)
   full       - Create tables and add sample data
+  unique     - Collapse duplicate rows and add the unique upsert keys
+  columns    - Add new model columns to existing tables
+  upgrade    - Create missing tables, columns and unique keys (run on every deploy)
         """)
         return
     
@@ -159,6 +278,12 @@ Commands:
     elif command == 'full':
         create_tables()
         add_sample_data()
+    elif command == 'unique':
+        add_unique_keys()
+    elif command == 'columns':
+        add_missing_columns()
+    elif command == 'upgrade':
+        upgrade_database()
     else:
         print(f"❌ Unknown command: {command}")
         print("Run without arguments to see available commands.")
@@ -1,8 +1,38 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime
 
 db = SQLAlchemy()
 
+def upsert(model):
+    """Return an INSERT for `model` that supports on_conflict_do_update() on SQLite and PostgreSQL"""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model)
+
+def greatest(current, incoming):
+    """Portable GREATEST(current, incoming) for use inside ON CONFLICT updates"""
+    return case((incoming > func.coalesce(current, 0), incoming), else_=current)
+
+def schema_problems():
+    """Differences between existing tables and the models that db.create_all() can't fix
+
+    Lists model columns missing from existing tables and unique indexes (the
+    upsert targets) that are missing or not unique; ``python migrate_db.py
+    upgrade`` fixes both. Tables that don't exist yet are left to create_all().
+    """
+    inspector = inspect(db.engine)
+    problems = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        problems += [f'missing column {table.name}.{column.name}' for column in table.columns if column.name not in existing]
+        unique = {index['name']: bool(index['unique']) for index in inspector.get_indexes(table.name)}
+        problems += [f'index {index.name} is missing or not unique' for index in table.indexes
+                     if index.unique and not unique.get(index.name)]
+    return problems
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -22,9 +52,9 @@ class Progress(db.Model):
     total_attempts = db.Column(db.Integer, default=0)
     last_attempt = db.Column(db.DateTime, default=datetime.utcnow)
 
-    # Index for faster queries
+    # One row per user and operation (upsert target)
     __table_args__ = (
-        db.Index('idx_progress_user_operation', 'user_id', 'operation'),
+        db.Index('idx_progress_user_operation', 'user_id', 'operation', unique=True),
     )
 
     @property
@@ -40,9 +70,9 @@ class Analytics(db.Model):
     average_response_time = db.Column(db.Float, default=0.0)
     session_duration = db.Column(db.Integer, default=0)  # in seconds
 
-    # Index for faster queries
+    # One row per user and day (upsert target)
     __table_args__ = (
-        db.Index('idx_analytics_user_date', 'user_id', 'session_date'),
+        db.Index('idx_analytics_user_date', 'user_id', 'session_date', unique=True),
     )
 
     @property
@@ -77,22 +107,44 @@ class LeaderboardScore(db.Model):
     # Indexes for better performance
     __table_args__ = (
         db.Index('idx_leaderboard_mode_score', 'mode', 'score'),  # For leaderboard queries
-        db.Index('idx_leaderboard_user_mode', 'user_id', 'mode'),  # For user score lookups
+        db.Index('idx_leaderboard_user_mode', 'user_id', 'mode', unique=True),  # One best score per user and mode (upsert target)
         db.Index('idx_leaderboard_created_at', 'created_at'),  # For time-based queries
     )
 
+class LeaderboardPeriodScore(db.Model):
+    """Best score per user and mode within one day or week, kept up to date as scores are submitted"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    mode = db.Column(db.String(20), nullable=False)  # 'standard' or 'marathon'
+    period = db.Column(db.String(10), nullable=False)  # 'daily' or 'weekly'
+    period_start = db.Column(db.Date, nullable=False)  # UTC day, or the Monday the week starts on
+    score = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationship
+    user = db.relationship('User', backref='leaderboard_period_scores')
+    
+    __table_args__ = (
+        db.Index('idx_leaderboard_period_mode_score', 'period', 'period_start', 'mode', 'score'),  # For leaderboard queries
+        db.Index('idx_leaderboard_period_user', 'user_id', 'mode', 'period', 'period_start', unique=True),  # Upsert target
+    )
+
 class Duel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.String(50), unique=True, nullable=False)
     player1_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     player2_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    status = db.Column(db.String(20), default='waiting')  # waiting, active, completed
+    status = db.Column(db.String(20), default='waiting')  # waiting, active, completed, expired
     current_question = db.Column(db.String(100), nullable=True)
     current_answer = db.Column(db.Integer, nullable=True)
     question_start_time = db.Column(db.DateTime, nullable=True)
     round_number = db.Column(db.Integer, default=1)
     max_rounds = db.Column(db.Integer, default=10)
     time_limit = db.Column(db.Integer, default=30)  # seconds per question
+    max_players = db.Column(db.Integer, default=2)
+    question_seed = db.Column(db.BigInteger, nullable=True)  # seed of the duel's question set
+    questions = db.Column(db.Text, nullable=True)  # JSON [[a, op, b], ...] for every round
+    journal = db.Column(db.Text, nullable=True)  # JSON event log, persisted at checkpoints and duel end
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     
@@ -107,6 +159,22 @@ class Duel(db.Model):
         db.Index('idx_duel_players', 'player1_id', 'player2_id'),
     )
 
+class DuelParticipant(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    duel_id = db.Column(db.Integer, db.ForeignKey('duel.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    duel = db.relationship('Duel', backref='participants')
+    user = db.relationship('User', backref='duel_participations')
+    
+    # One row per player and duel; player1_id/player2_id on Duel are kept for two-player history
+    __table_args__ = (
+        db.Index('idx_duel_participant_duel_user', 'duel_id', 'user_id', unique=True),
+        db.Index('idx_duel_participant_user', 'user_id'),
+    )
+
 class DuelScore(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     duel_id = db.Column(db.Integer, db.ForeignKey('duel.id'), nullable=False)
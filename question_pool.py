@@ -0,0 +1,95 @@
+"""
+Pre-generated question pools for the math trainer.
+
+Questions are built in large blocks per operation with a single NumPy pass and
+handed out from a deque, so serving a question is O(1) and never calls eval().
+"""
+
+import random
+import threading
+from collections import deque
+
+import numpy as np
+
+OPERATIONS = ('+', '-', '*', '/')
+
+
+def build_block(operation, size, rng):
+    """Build `size` questions for one operation as (a, op, b, answer) tuples.
+
+    Operand ranges match the original eval()-based generator, kept as the
+    baseline in benchmarks/bench_question_pool.py.
+    """
+    if operation == '+':
+        # Addition: both numbers from 2 to 100
+        a = rng.integers(2, 101, size)
+        b = rng.integers(2, 101, size)
+        answer = a + b
+    elif operation == '-':
+        # Subtraction: b <= a for a non-negative result
+        a = rng.integers(2, 101, size)
+        b = rng.integers(2, a + 1)
+        answer = a - b
+    elif operation == '*':
+        # Multiplication: first number 2-12, second number 2-100
+        a = rng.integers(2, 13, size)
+        b = rng.integers(2, 101, size)
+        answer = a * b
+    elif operation == '/':
+        # Division: multiplication in reverse
+        b = rng.integers(2, 13, size)
+        answer = rng.integers(2, 101, size)
+        a = b * answer
+    else:
+        raise ValueError(f'Unknown operation: {operation}')
+
+    return [(x, operation, y, z) for x, y, z in zip(a.tolist(), b.tolist(), answer.tolist())]
+
+
+class QuestionPool:
+    """Per-operation pools of ready-made questions, refilled in the background."""
+
+    def __init__(self, block_size=4096, low_water=1024, seed=None):
+        self.block_size = block_size
+        self.low_water = low_water
+        self.rng = np.random.default_rng(seed)
+        self.pools = {op: deque() for op in OPERATIONS}
+        self._refilling = set()
+        self._lock = threading.Lock()
+
+    def _refill(self, operation):
+        with self._lock:
+            block = build_block(operation, self.block_size, self.rng)
+        self.pools[operation].extend(block)
+        self._refilling.discard(operation)
+
+    def _schedule_refill(self, operation):
+        if operation in self._refilling:
+            return
+        self._refilling.add(operation)
+        threading.Thread(target=self._refill, args=(operation,), daemon=True).start()
+
+    def take(self, operation):
+        """Return one (a, op, b, answer) tuple for the given operation."""
+        pool = self.pools[operation]
+        if len(pool) <= self.low_water:
+            self._schedule_refill(operation)
+        try:
+            return pool.popleft()
+        except IndexError:
+            # Background refill hasn't landed yet; build one block inline
+            with self._lock:
+                pool.extend(build_block(operation, self.block_size, self.rng))
+            return pool.popleft()
+
+
+class PooledQuestionGenerator:
+    """Random questions drawn from a QuestionPool."""
+
+    def __init__(self, pool=None):
+        self.pool = pool or QuestionPool()
+
+    def draw(self, operations=None):
+        """Return one (a, op, b, answer) tuple for a random operation."""
+        operations = [op for op in operations or () if op in OPERATIONS] or OPERATIONS
+        return self.pool.take(random.choice(operations))
@@ -0,0 +1,103 @@
+"""
+Indexed question spaces for range-aware, non-repeating sampling.
+
+Every valid question for an (operations, min_range, max_range) configuration
+has a rank in [0, size). Sampling walks a keyed pseudo-random permutation of
+those ranks (a Feistel network with cycle walking), so draw ``index`` of
+stream ``seed`` never repeats until the whole space has been used, and each
+draw is O(1) time with only (seed, index) kept per session.
+
+Operand ranges:
+  +  a, b in [min, max]
+  -  a, b in [min, max] with b <= a
+  *  a, b in [min, max]
+  /  divisor and quotient in [min, max] (multiplication in reverse)
+"""
+
+from math import isqrt
+
+from question_pool import OPERATIONS
+from question_streams import splitmix64
+
+FEISTEL_ROUNDS = 4
+
+
+class FeistelPermutation:
+    """A keyed bijection on [0, size) built from a balanced Feistel network."""
+
+    def __init__(self, size, key):
+        self.size = size
+        self.half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self.half_mask = (1 << self.half_bits) - 1
+        self.round_keys = []
+        for _ in range(FEISTEL_ROUNDS):
+            key = splitmix64(key)
+            self.round_keys.append(key)
+
+    def _encrypt(self, x):
+        left, right = x >> self.half_bits, x & self.half_mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ (splitmix64(right ^ round_key) & self.half_mask)
+        return (left << self.half_bits) | right
+
+    def __getitem__(self, index):
+        # Cycle-walk until the value lands back inside [0, size)
+        x = self._encrypt(index)
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+
+class QuestionSpace:
+    def __init__(self, operations=None, min_range=1, max_range=100):
+        if min_range < 1 or max_range < min_range:
+            raise ValueError('Invalid question range')
+        self.operations = [op for op in OPERATIONS if op in (operations or OPERATIONS)] or list(OPERATIONS)
+        self.min_range = min_range
+        self.span = max_range - min_range + 1
+
+        # Each operation owns a contiguous block of ranks
+        self.segments = []
+        offset = 0
+        for operation in self.operations:
+            count = self.span * (self.span + 1) // 2 if operation == '-' else self.span * self.span
+            self.segments.append((offset, count, operation))
+            offset += count
+        self.size = offset
+
+    def __len__(self):
+        return self.size
+
+    def question(self, rank):
+        """Return the question with the given rank as an (a, op, b, answer) tuple."""
+        for offset, count, operation in self.segments:
+            if rank < offset + count:
+                rank -= offset
+                break
+        else:
+            raise IndexError(rank)
+
+        lo = self.min_range
+        if operation == '-':
+            # Triangular ranking: rank = i * (i + 1) / 2 + j with 0 <= j <= i
+            i = (isqrt(8 * rank + 1) - 1) // 2
+            j = rank - i * (i + 1) // 2
+            a, b = lo + i, lo + j
+            return a, operation, b, a - b
+
+        x, y = lo + rank // self.span, lo + rank % self.span
+        if operation == '+':
+            return x, operation, y, x + y
+        if operation == '*':
+            return x, operation, y, x * y
+        return x * y, operation, x, y
+
+    def sample(self, seed, index):
+        """Return draw `index` of the non-repeating stream `seed`.
+
+        Each pass over the space uses a fresh permutation, so streams keep
+        going after every question has been asked once.
+        """
+        cycle, position = divmod(index, self.size)
+        permutation = FeistelPermutation(self.size, splitmix64(seed) ^ cycle)
+        return self.question(permutation[position])
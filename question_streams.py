@@ -0,0 +1,117 @@
+"""
+Deterministic, counter-based question streams.
+
+Question ``index`` of stream ``seed`` is a pure function of (seed, index):
+the pair is hashed with SplitMix64 and the resulting words pick the operation
+and operands. Any worker can reproduce any question in O(1) without shared
+state or replaying the stream.
+"""
+
+import secrets
+
+from question_pool import OPERATIONS
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+def splitmix64(x):
+    """SplitMix64 finalizer: a fast, well-mixed 64-bit bijection."""
+    x = (x + GOLDEN_GAMMA) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def new_seed():
+    return secrets.randbits(63)
+
+
+def _words(seed, index):
+    """Yield independent 64-bit words for question `index` of stream `seed`."""
+    state = splitmix64(seed ^ splitmix64(index))
+    while True:
+        state = splitmix64(state)
+        yield state
+
+
+def question_at(seed, index, operations=None):
+    """Return question `index` of stream `seed` as an (a, op, b, answer) tuple.
+
+    Operand ranges match build_block in question_pool.py.
+    """
+    operations = [op for op in operations or () if op in OPERATIONS] or OPERATIONS
+    words = _words(seed, index)
+
+    def randint(low, high):
+        return low + next(words) % (high - low + 1)
+
+    operation = operations[next(words) % len(operations)]
+    if operation == '+':
+        a, b = randint(2, 100), randint(2, 100)
+        return a, operation, b, a + b
+    if operation == '-':
+        a = randint(2, 100)
+        b = randint(2, a)
+        return a, operation, b, a - b
+    if operation == '*':
+        a, b = randint(2, 12), randint(2, 100)
+        return a, operation, b, a * b
+    b, answer = randint(2, 12), randint(2, 100)
+    return b * answer, operation, b, answer
+
+
+class QuestionStream:
+    """A replayable question sequence addressed by (seed, index)."""
+
+    def __init__(self, seed=None, operations=None):
+        self.seed = new_seed() if seed is None else seed
+        self.operations = operations
+
+    def __getitem__(self, index):
+        return question_at(self.seed, index, self.operations)
+
+    def take(self, start, count):
+        return [question_at(self.seed, index, self.operations) for index in range(start, start + count)]
+
+
+# Largest operand or result per operation, used to normalise difficulty to [0, 1]
+DIFFICULTY_SCALE = {'+': 200, '-': 100, '*': 1200, '/': 1200}
+
+
+def question_difficulty(a, operation, b):
+    """Rough difficulty in [0, 1]: the size of the largest number involved."""
+    if operation == '+':
+        size = a + b
+    elif operation == '*':
+        size = a * b
+    else:
+        size = a
+    return min(1.0, size / DIFFICULTY_SCALE[operation])
+
+
+def balanced_question_set(seed, count, bands=3, max_attempts=64):
+    """Return `count` (a, op, b, answer) questions that are reproducible from `seed`.
+
+    Operations are spread evenly across the set and each position targets a
+    difficulty band (easy, medium, hard, easy, ...), so every duel gets the
+    same mix regardless of seed.
+    """
+    words = _words(seed, 1 << 62)
+    operations = [OPERATIONS[i % len(OPERATIONS)] for i in range(count)]
+    # Deterministic Fisher-Yates shuffle so operations don't follow a fixed cycle
+    for i in range(count - 1, 0, -1):
+        j = next(words) % (i + 1)
+        operations[i], operations[j] = operations[j], operations[i]
+
+    questions = []
+    for position, operation in enumerate(operations):
+        band = position % bands
+        low = band / bands
+        high = (band + 1) / bands if band < bands - 1 else float('inf')
+        for attempt in range(max_attempts):
+            question = question_at(seed, position * max_attempts + attempt, [operation])
+            if low <= question_difficulty(*question[:3]) < high:
+                break
+        questions.append(question)
+    return questions
@@ -0,0 +1,70 @@
+"""
+Stateless signed question tokens.
+
+A token carries the operands, operation and issue time of a question plus a
+truncated HMAC-SHA256 signature, so any worker holding SECRET_KEY can verify
+it and recompute the answer without a database or in-memory lookup.
+
+Token layout: ``{a}.{op}.{b}.{issued_at}.{signature}`` where op is one of
+``a`` (add), ``s`` (subtract), ``m`` (multiply) or ``d`` (divide).
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+
+OPERATION_CODES = {'+': 'a', '-': 's', '*': 'm', '/': 'd'}
+CODE_OPERATIONS = {code: op for op, code in OPERATION_CODES.items()}
+
+
+class InvalidQuestionToken(ValueError):
+    pass
+
+
+def compute_answer(a, operation, b):
+    """Answer a question with integer arithmetic only."""
+    if operation == '+':
+        return a + b
+    if operation == '-':
+        return a - b
+    if operation == '*':
+        return a * b
+    if operation == '/':
+        return a // b
+    raise ValueError(f'Unknown operation: {operation}')
+
+
+class QuestionTokenSigner:
+    def __init__(self, secret_key, max_age=3600):
+        self.key = hashlib.sha256(b'question-token:' + str(secret_key).encode()).digest()
+        self.max_age = max_age
+
+    def _signature(self, payload):
+        digest = hmac.new(self.key, payload.encode(), hashlib.sha256).digest()[:16]
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def sign(self, a, operation, b, issued_at=None):
+        issued_at = int(issued_at if issued_at is not None else time.time())
+        payload = f'{a}.{OPERATION_CODES[operation]}.{b}.{issued_at}'
+        return f'{payload}.{self._signature(payload)}'
+
+    def verify(self, token, now=None):
+        """Return (a, operation, b, issued_at) or raise InvalidQuestionToken."""
+        try:
+            payload, signature = str(token).rsplit('.', 1)
+            a, code, b, issued_at = payload.split('.')
+            a, b, issued_at = int(a), int(b), int(issued_at)
+            operation = CODE_OPERATIONS[code]
+        except (ValueError, KeyError):
+            raise InvalidQuestionToken('Malformed question token')
+
+        # Bytes, since compare_digest rejects str holding non-ASCII characters
+        if not hmac.compare_digest(signature.encode('utf-8', 'surrogatepass'), self._signature(payload).encode()):
+            raise InvalidQuestionToken('Bad question token signature')
+
+        now = now if now is not None else time.time()
+        if now - issued_at > self.max_age:
+            raise InvalidQuestionToken('Question token expired')
+
+        return a, operation, b, issued_at
@@ -0,0 +1,143 @@
+"""
+Per-user streaming session statistics.
+
+Every answer updates a running mean/variance (Welford) and two P-square
+quantile estimators in O(1) time and memory. Sessions live in a bounded LRU
+keyed by user_id and restart after SESSION_IDLE_TIMEOUT seconds of inactivity.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class P2Quantile:
+    """Streaming quantile estimate using the P-square algorithm (Jain & Chlamtac, 1985)."""
+
+    __slots__ = ('p', 'heights', 'positions', 'desired', 'increments')
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(1, 5) if x < q[i]) - 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Nudge the three middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def value(self):
+        q = self.heights
+        if not q:
+            return None
+        if len(q) < 5:
+            return q[round(self.p * (len(q) - 1))]
+        return q[2]
+
+
+class SessionStats:
+    """Constant-memory statistics for one user's practice session."""
+
+    __slots__ = ('started_at', 'last_seen', 'count', 'correct', 'mean', 'm2', 'p50', 'p90')
+
+    def __init__(self, now):
+        self.started_at = now
+        self.last_seen = now
+        self.count = 0
+        self.correct = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.p50 = P2Quantile(0.5)
+        self.p90 = P2Quantile(0.9)
+
+    def add(self, response_time, is_correct, now):
+        self.last_seen = now
+        self.count += 1
+        if is_correct:
+            self.correct += 1
+        delta = response_time - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (response_time - self.mean)
+        self.p50.add(response_time)
+        self.p90.add(response_time)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def duration(self):
+        return int(self.last_seen - self.started_at)
+
+    def to_dict(self):
+        return {
+            'questions_attempted': self.count,
+            'correct_answers': self.correct,
+            'mean_response_time': self.mean,
+            'response_time_stddev': self.variance ** 0.5,
+            'response_time_p50': self.p50.value(),
+            'response_time_p90': self.p90.value(),
+            'session_duration': self.duration
+        }
+
+
+class SessionStatsStore:
+    """Bounded LRU of SessionStats keyed by user_id."""
+
+    def __init__(self, capacity=10000, idle_timeout=1800):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+
+    def get(self, user_id):
+        stats = self.sessions.get(user_id)
+        if stats is None or time.time() - stats.last_seen > self.idle_timeout:
+            return None
+        return stats
+
+    def record(self, user_id, response_time, is_correct, now=None):
+        """Add one answer to the user's current session and return its stats."""
+        now = now or time.time()
+        stats = self.sessions.get(user_id)
+        if stats is None or now - stats.last_seen > self.idle_timeout:
+            stats = SessionStats(now)
+            self.sessions[user_id] = stats
+        self.sessions.move_to_end(user_id)
+        stats.add(response_time, is_correct, now)
+
+        while len(self.sessions) > self.capacity:
+            self.sessions.popitem(last=False)
+        return stats
@@ -0,0 +1,169 @@
+"""
+Write-behind aggregation buffer for Progress and Analytics updates.
+
+Answer checks only add counter deltas to an in-memory buffer. A background
+task flushes the accumulated deltas to the database every
+WRITE_BEHIND_INTERVAL_MS milliseconds, or as soon as WRITE_BEHIND_MAX_ENTRIES
+keys are pending, and the buffer is drained when the process exits.
+
+A flush that fails puts its deltas back into the buffer and the next tick
+retries them, waiting twice as long after each consecutive failure; after
+WRITE_BEHIND_MAX_RETRIES failures in a row the pending deltas are dropped.
+"""
+
+import atexit
+import threading
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models import db, upsert, greatest, Progress, Analytics
+
+
+class StatsWriteBuffer:
+    def __init__(self, interval_ms=500, max_entries=1000, max_retries=5):
+        self.interval_ms = interval_ms
+        self.max_entries = max_entries
+        self.max_retries = max_retries
+        self.failures = 0  # consecutive failed flushes
+        self.enabled = True
+        self.app = None
+        self.socketio = None
+        self.progress = {}   # {(user_id, operation): [attempts, correct, last_attempt]}
+        self.analytics = {}  # {(user_id, session_date): [attempts, correct, response_time_sum, session_duration]}
+        self._lock = threading.Lock()
+        self._flush_scheduled = False
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self.interval_ms = app.config.get('WRITE_BEHIND_INTERVAL_MS', self.interval_ms)
+        self.max_entries = app.config.get('WRITE_BEHIND_MAX_ENTRIES', self.max_entries)
+        self.max_retries = app.config.get('WRITE_BEHIND_MAX_RETRIES', self.max_retries)
+        self.enabled = app.config.get('WRITE_BEHIND_ENABLED', True)
+        atexit.register(self.flush)
+        if self.enabled:
+            socketio.start_background_task(self._run)
+
+    def __len__(self):
+        return len(self.progress) + len(self.analytics)
+
+    def add(self, user_id, operation, attempts, correct, response_time_sum, session_duration=0, when=None):
+        """Accumulate counter deltas for one user/operation/day."""
+        when = when or datetime.utcnow()
+        with self._lock:
+            progress = self.progress.setdefault((user_id, operation), [0, 0, when])
+            progress[0] += attempts
+            progress[1] += correct
+            progress[2] = max(progress[2], when)
+
+            analytics = self.analytics.setdefault((user_id, when.date()), [0, 0, 0.0, 0])
+            analytics[0] += attempts
+            analytics[1] += correct
+            analytics[2] += response_time_sum
+            analytics[3] = max(analytics[3], session_duration)
+
+            pending = len(self.progress) + len(self.analytics)
+
+        if not self.enabled:
+            self.flush()
+        elif pending >= self.max_entries and not self._flush_scheduled and not self.failures:
+            self._flush_scheduled = True
+            self.socketio.start_background_task(self.flush)
+
+    def _swap(self):
+        with self._lock:
+            progress, self.progress = self.progress, {}
+            analytics, self.analytics = self.analytics, {}
+            self._flush_scheduled = False
+        return progress, analytics
+
+    def _requeue(self, progress_deltas, analytics_deltas):
+        """Merge the deltas of a failed flush back into the buffer."""
+        with self._lock:
+            for key, (attempts, correct, last_attempt) in progress_deltas.items():
+                progress = self.progress.setdefault(key, [0, 0, last_attempt])
+                progress[0] += attempts
+                progress[1] += correct
+                progress[2] = max(progress[2], last_attempt)
+            for key, (attempts, correct, response_time_sum, duration) in analytics_deltas.items():
+                analytics = self.analytics.setdefault(key, [0, 0, 0.0, 0])
+                analytics[0] += attempts
+                analytics[1] += correct
+                analytics[2] += response_time_sum
+                analytics[3] = max(analytics[3], duration)
+
+    def flush(self):
+        """Write all pending deltas as one bulk upsert per table, in one transaction."""
+        progress_deltas, analytics_deltas = self._swap()
+        if not progress_deltas and not analytics_deltas:
+            return
+
+        with self.app.app_context():
+            try:
+                if progress_deltas:
+                    stmt = upsert(Progress).values([
+                        {
+                            'user_id': user_id,
+                            'operation': operation,
+                            'difficulty_level': 1,
+                            'total_attempts': attempts,
+                            'correct_answers': correct,
+                            'last_attempt': last_attempt
+                        }
+                        for (user_id, operation), (attempts, correct, last_attempt) in progress_deltas.items()
+                    ])
+                    db.session.execute(stmt.on_conflict_do_update(
+                        index_elements=['user_id', 'operation'],
+                        set_={
+                            'total_attempts': func.coalesce(Progress.total_attempts, 0) + stmt.excluded.total_attempts,
+                            'correct_answers': func.coalesce(Progress.correct_answers, 0) + stmt.excluded.correct_answers,
+                            'last_attempt': stmt.excluded.last_attempt
+                        }
+                    ))
+
+                if analytics_deltas:
+                    stmt = upsert(Analytics).values([
+                        {
+                            'user_id': user_id,
+                            'session_date': session_date,
+                            'questions_attempted': attempts,
+                            'correct_answers': correct,
+                            'average_response_time': response_time_sum / attempts,
+                            'session_duration': duration
+                        }
+                        for (user_id, session_date), (attempts, correct, response_time_sum, duration) in analytics_deltas.items()
+                    ])
+                    previous_attempts = func.coalesce(Analytics.questions_attempted, 0)
+                    db.session.execute(stmt.on_conflict_do_update(
+                        index_elements=['user_id', 'session_date'],
+                        set_={
+                            'questions_attempted': previous_attempts + stmt.excluded.questions_attempted,
+                            'correct_answers': func.coalesce(Analytics.correct_answers, 0) + stmt.excluded.correct_answers,
+                            # Weighted running mean over every attempt recorded that day
+                            'average_response_time': (
+                                func.coalesce(Analytics.average_response_time, 0.0) * previous_attempts
+                                + stmt.excluded.average_response_time * stmt.excluded.questions_attempted
+                            ) / (previous_attempts + stmt.excluded.questions_attempted),
+                            'session_duration': greatest(Analytics.session_duration, stmt.excluded.session_duration)
+                        }
+                    ))
+
+                db.session.commit()
+                self.failures = 0
+            except Exception as e:
+                db.session.rollback()
+                self.failures += 1
+                if self.failures > self.max_retries:
+                    print(f"Write-behind flush error, dropping {len(progress_deltas) + len(analytics_deltas)} "
+                          f"pending entries after {self.max_retries} retries: {e}")
+                    self.failures = 0
+                else:
+                    print(f"Write-behind flush error (attempt {self.failures}), will retry: {e}")
+                    self._requeue(progress_deltas, analytics_deltas)
+
+    def _run(self):
+        while True:
+            # Back off while the database keeps failing: 1x, 2x, 4x, ... the interval
+            self.socketio.sleep(self.interval_ms / 1000 * 2 ** min(self.failures, self.max_retries))
+            self.flush()